@@ -1,20 +1,70 @@
-import csv
 from io import StringIO
-from typing import Dict, Optional
+from types import SimpleNamespace
+from typing import Dict, Optional, List, Iterator, Callable, TextIO, Tuple
 
+from anki.collection import Collection, OpChanges
+from anki.models import NotetypeId
 from anki.notes import NoteId
 from aqt import mw
 from aqt.browser import Browser
 from aqt.qt import (
 	Qt, QDialog, QVBoxLayout, QTextEdit, QPushButton,
 	QLabel, QLayout, QSplitter, QGridLayout, QCheckBox,
-	QButtonGroup, QWidget,
+	QButtonGroup, QWidget, QFileDialog, QTabWidget, QTableView, QHeaderView,
+	QComboBox, QHBoxLayout,
 )
 from aqt.utils import showInfo
 
+from ..background import BulkProgress, run_bulk_op, run_bulk_query
+from ..bulk_notes import (
+	iter_note_records, NoteRecord, NoteEdit, NoteWriter, count_notes_by_model, note_type_ids, note_type_names,
+)
+from ..note_table_model import NoteTableModel
+from ...table_io import (
+	open_table_file, iter_chunks, READ_CHUNK_ROWS, TABLE_FORMATS, TableFormat, TableFormatError,
+)
 from ...utils import get_model_columns
 
 col_note_id = "Note ID"
+col_note_type = "Note Type"
+
+EXPORT_PREVIEW_LIMIT = 1000
+""" Maximum number of notes exported to the text panel, larger exports should go to a file """
+
+
+IMPORT_MAX_ERRORS = 10
+""" Maximum number of invalid rows listed in the import results """
+
+
+def file_filters(table_format: TableFormat) -> Tuple[str, str, str]:
+	"""
+	Returns the file dialog filters of a table format.
+
+	:param table_format: The format of the files
+	:return: The filters for plain files, gzip-compressed files, and both of them
+	"""
+
+	ext = table_format.extension
+
+	return (
+		f"{table_format.name} files (*{ext})",
+		f"Compressed {table_format.name} files (*{ext}.gz)",
+		f"All {table_format.name} files (*{ext} *{ext}.gz)",
+	)
+
+
+def export_row(record: NoteRecord, type_names: Dict[NotetypeId, str], columns: List[str]) -> list:
+	"""
+	Builds the exported row of a note: its id, its note type and the given fields.
+	Fields the note type doesn't have are exported empty.
+
+	:param record: The record of the note
+	:param type_names: The names of the note types, by id
+	:param columns: The names of the exported fields
+	:return: The values of the row
+	"""
+
+	return [record.id, type_names.get(record.mid, str(record.mid))] + [record.fields.get(field, '') for field in columns]
 
 
 def aqt_show_csv_io(browser: Browser) -> None:
@@ -44,6 +94,8 @@ class ModalCSVIO(QDialog):
 	the export panel will show a copiable csv export (headers included) of the selected notes.
 	The import panel will allow the user to copy a csv (headers included) into the text area,
 	and edit the selected notes with the csv data.
+	Notes of different note types can be selected together:
+	each row carries its note type, and the columns are the union of the fields of the note types.
 	"""
 
 	def __init__(self, browser: Browser):
@@ -69,30 +121,67 @@ class ModalCSVIO(QDialog):
 
 		# Buttons
 		self.btn_export: Optional[QPushButton] = None
+		self.btn_export_file: Optional[QPushButton] = None
 		self.btn_import: Optional[QPushButton] = None
+		self.btn_import_file: Optional[QPushButton] = None
+
+		# CheckBoxes
+		self.chk_diff_apply: Optional[QCheckBox] = None
+
+		# ComboBoxes
+		self.combo_format: Optional[QComboBox] = None
 
 		# TextEdits
 		self.edit_export: Optional[QTextEdit] = None
 		self.edit_import: Optional[QTextEdit] = None
 
+		# Export preview
+		self.tabs_export: Optional[QTabWidget] = None
+		self.table_preview: Optional[QTableView] = None
+		self.model_preview: Optional[NoteTableModel] = None
+
 		models = self.selected_notes_stats()
 
-		if len(models) != 1:
-			self.setLayout(self.__layout_error__(models))
+		if not models:
+			self.setLayout(self.__layout_error__())
 			self.setFixedSize(400, 200)
 			return
 
-		self.setLayout(self.__layout__(*models.popitem()))
+		self.setLayout(self.__layout__(models))
 
 		return
 
-	def __layout__(self, model_name: str, note_count: int) -> QLayout:
+	def __layout__(self, models: Dict[str, int]) -> QLayout:
 
 		# Create the main layout
 		self.layout = QVBoxLayout(self)
 
 		# Title label
-		self.lbl_title = QLabel(f'{model_name} - {note_count} notes')
+		if len(models) == 1:
+			model_name, note_count = next(iter(models.items()))
+			self.lbl_title = QLabel(f'{model_name} - {note_count} notes')
+		else:
+			str_models = ', '.join(f'{model_name} ({note_count})' for model_name, note_count in models.items())
+			self.lbl_title = QLabel(f'{sum(models.values())} notes of {len(models)} note types: {str_models}')
+			self.lbl_title.setWordWrap(True)
+
+		# Columns of every selected note type, in order of appearance
+		columns = list(dict.fromkeys(
+			column
+			for model_name in models
+			for column in get_model_columns(model_name)
+		))
+
+		# Format of the exported/imported tables
+		self.combo_format = QComboBox()
+		self.combo_format.addItems(list(TABLE_FORMATS))
+		self.combo_format.setToolTip('Format used both to export and to import the notes')
+		self.combo_format.currentTextChanged.connect(self.__on_format_changed__)
+
+		layout_format = QHBoxLayout()
+		layout_format.addWidget(QLabel('Format:'))
+		layout_format.addWidget(self.combo_format)
+		layout_format.addStretch()
 
 		# Splitter for import/export
 		self.layout_splitter = QSplitter()
@@ -100,6 +189,7 @@ class ModalCSVIO(QDialog):
 
 		# Build the layout
 		self.layout.addWidget(self.lbl_title)
+		self.layout.addLayout(layout_format)
 		self.layout.addWidget(self.layout_splitter)
 		tmp_widget = QWidget()
 		tmp_widget.setLayout(self.__layout_export__())
@@ -107,7 +197,13 @@ class ModalCSVIO(QDialog):
 		tmp_widget = QWidget()
 		tmp_widget.setLayout(self.__layout_import__())
 		self.layout_splitter.addWidget(tmp_widget)
-		self.layout.addLayout(self.__layout_columns__(model_name))
+		self.layout.addLayout(self.__layout_columns__(columns))
+
+		# Preview the selected notes, with every column
+		self.model_preview = NoteTableModel(
+			mw.col, self.browser.selectedNotes(), col_note_id, col_note_type, columns, parent=self
+		)
+		self.table_preview.setModel(self.model_preview)
 
 		return self.layout
 
@@ -116,17 +212,32 @@ class ModalCSVIO(QDialog):
 		# Export section
 		self.layout_export = QVBoxLayout()
 
-		self.lbl_export = QLabel('Exported CSV (copy this)')
+		self.lbl_export = QLabel(f'Exported {self.selected_format().name} (copy this)')
+
+		# Preview of the notes, rows are only fetched when scrolled into view
+		self.table_preview = QTableView()
+		self.table_preview.setWordWrap(False)
+		self.table_preview.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
 
 		self.edit_export = QTextEdit()
 		self.edit_export.setReadOnly(True)
 
+		self.tabs_export = QTabWidget()
+		self.tabs_export.addTab(self.table_preview, 'Preview')
+		self.tabs_export.addTab(self.edit_export, 'Text')
+
 		self.btn_export = QPushButton('Export')
+		self.btn_export.setToolTip(f'Export up to {EXPORT_PREVIEW_LIMIT} notes here')
 		self.btn_export.clicked.connect(self.export_csv)
 
+		self.btn_export_file = QPushButton('Export to File')
+		self.btn_export_file.setToolTip('Export all the selected notes to a file (.gz to compress it)')
+		self.btn_export_file.clicked.connect(self.export_csv_file)
+
 		self.layout_export.addWidget(self.lbl_export)
-		self.layout_export.addWidget(self.edit_export)
+		self.layout_export.addWidget(self.tabs_export)
 		self.layout_export.addWidget(self.btn_export)
+		self.layout_export.addWidget(self.btn_export_file)
 
 		return self.layout_export
 
@@ -135,20 +246,30 @@ class ModalCSVIO(QDialog):
 		# Export section
 		self.layout_import = QVBoxLayout()
 
-		self.lbl_import = QLabel('Paste CSV here to import')
+		self.lbl_import = QLabel(f'Paste {self.selected_format().name} here to import')
 
 		self.edit_import = QTextEdit()
 
 		self.btn_import = QPushButton('Import')
 		self.btn_import.clicked.connect(self.import_csv)
 
+		self.chk_diff_apply = QCheckBox('Only write changed notes')
+		self.chk_diff_apply.setToolTip('Skip the notes whose fields already match the table, so they are not re-synced')
+		self.chk_diff_apply.setChecked(True)
+
+		self.btn_import_file = QPushButton('Import from File')
+		self.btn_import_file.setToolTip('Import a file (or a .gz compressed one) without pasting it here')
+		self.btn_import_file.clicked.connect(self.import_csv_file)
+
 		self.layout_import.addWidget(self.lbl_import)
 		self.layout_import.addWidget(self.edit_import)
+		self.layout_import.addWidget(self.chk_diff_apply)
 		self.layout_import.addWidget(self.btn_import)
+		self.layout_import.addWidget(self.btn_import_file)
 
 		return self.layout_import
 
-	def __layout_columns__(self, note_name: str) -> QLayout:
+	def __layout_columns__(self, columns: List[str]) -> QLayout:
 
 		self.layout_checkboxes = QGridLayout(self)
 
@@ -166,28 +287,32 @@ class ModalCSVIO(QDialog):
 		self.chk_id.setChecked(True)
 		self.chk_id.setEnabled(False)
 
-		# Add 'Select All'/'Note ID' checkboxes to the layout
+		# Note Type checkbox
+		self.chk_type = QCheckBox(col_note_type)
+		self.chk_type.setChecked(True)
+		self.chk_type.setEnabled(False)
+
+		# Add 'Select All'/'Note ID'/'Note Type' checkboxes to the layout
 		self.layout_checkboxes.addWidget(self.chk_all, 0, 0, 1, 2)
-		self.layout_checkboxes.addWidget(self.chk_id, 0, 2, 1, 2)
+		self.layout_checkboxes.addWidget(self.chk_id, 0, 2)
+		self.layout_checkboxes.addWidget(self.chk_type, 0, 3)
 
-		# Add other checkboxes
-		for i, column in enumerate(get_model_columns(note_name)):
+		# Add other checkboxes, ids match their column in the preview
+		for i, column in enumerate(columns):
 			checkbox = QCheckBox(column)
 			checkbox.setChecked(True)
-			self.group_checkboxes.addButton(checkbox, i + 1)
+			self.group_checkboxes.addButton(checkbox, i + 2)
 			self.layout_checkboxes.addWidget(checkbox, i // 4 + 1, i % 4)
 
 		return self.layout_checkboxes
 
-	def __layout_error__(self, models: Dict[str, int]) -> QLayout:
+	def __layout_error__(self) -> QLayout:
 
 		self.layout_error = QVBoxLayout(self)
 
-		self.lbl_title = QLabel('Error: a single note type must be selected to perform this operation.')
+		self.lbl_title = QLabel('Error: no notes selected.')
 
-		str_models = ', '.join(models.keys()) or 'None'
-
-		self.lbl_error.setText(f"Selected note types: {str_models}")
+		self.lbl_error = QLabel('Select the notes to export or import in the browser, then open this dialog again.')
 		self.lbl_error.setWordWrap(True)
 
 		self.layout_error.addWidget(self.lbl_title)
@@ -200,6 +325,8 @@ class ModalCSVIO(QDialog):
 		for btn in self.group_checkboxes.buttons():
 			btn.setChecked(state)
 
+		self.__sync_preview_columns__()
+
 		return
 
 	def __on_checkbox_clicked__(self, button: QCheckBox) -> None:
@@ -218,6 +345,21 @@ class ModalCSVIO(QDialog):
 		# Update 'Select All' checkbox
 		self.chk_all.setChecked(state)
 
+		self.__sync_preview_columns__()
+
+		return
+
+	def __sync_preview_columns__(self) -> None:
+		"""
+		Shows in the preview only the columns whose checkbox is checked.
+		Each checkbox id is the position of its column in the preview.
+
+		:return: ``None``
+		"""
+
+		for btn in self.group_checkboxes.buttons():
+			self.table_preview.setColumnHidden(self.group_checkboxes.id(btn), not btn.isChecked())
+
 		return
 
 	def selected_notes_stats(self) -> Dict[str, int]:
@@ -233,18 +375,47 @@ class ModalCSVIO(QDialog):
 			return dict()
 
 		note_types = dict()
-		for note_id in selected_notes_ids:
+		for mid, count in count_notes_by_model(mw.col, selected_notes_ids).items():
 
-			note = mw.col.get_note(note_id)
-			note_type = note.note_type()["name"]
+			model = mw.col.models.get(mid)
+			note_type = model["name"] if model else str(mid)
 
-			if note_type not in note_types:
-				note_types[note_type] = 0
-
-			note_types[note_type] += 1
+			note_types[note_type] = count
 
 		return note_types
 
+	def selected_columns(self) -> List[str]:
+		"""
+		:return: The names of the checked columns, without the note ID column
+		"""
+
+		return [
+			btn.text()
+			for btn in self.group_checkboxes.buttons()
+			if btn.isChecked()
+		]
+
+	def selected_format(self) -> TableFormat:
+		"""
+		:return: The table format chosen for export and import
+		"""
+
+		return TABLE_FORMATS[self.combo_format.currentText()]
+
+	def __on_format_changed__(self, _: str) -> None:
+		"""
+		Names the chosen format in the export and import panels.
+
+		:param _: The name of the format
+		:return: ``None``
+		"""
+
+		name = self.selected_format().name
+		self.lbl_export.setText(f'Exported {name} (copy this)')
+		self.lbl_import.setText(f'Paste {name} here to import')
+
+		return
+
 	def export_csv(self):
 
 		selected_notes = self.browser.selectedNotes()
@@ -252,21 +423,89 @@ class ModalCSVIO(QDialog):
 			self.edit_export.setPlainText("No notes selected.")
 			return
 
-		columns = [
-			btn.text()
-			for btn in self.group_checkboxes.buttons()
-			if btn.isChecked()
-		]
+		columns = self.selected_columns()
+		table_format = self.selected_format()
 
-		output = StringIO()
-		writer = csv.writer(output)
-		writer.writerow([col_note_id] + columns)
+		# Large selections only get a preview, the text panel can't handle them
+		preview_notes = selected_notes[:EXPORT_PREVIEW_LIMIT]
+		if len(preview_notes) < len(selected_notes):
+			self.lbl_export.setText(
+				f'Exported {table_format.name} (copy this) - first {len(preview_notes)} of {len(selected_notes)} notes, '
+				f'use Export to File for all of them'
+			)
+		else:
+			self.lbl_export.setText(f'Exported {table_format.name} (copy this)')
 
-		for note_id in selected_notes:
-			note = mw.col.get_note(note_id)
-			writer.writerow([note_id] + [note[field] for field in columns])
+		output = StringIO()
+		records = iter_note_records(mw.col, preview_notes, fields=columns)
+		type_names = note_type_names(mw.col)
+		table_format.write_rows(
+			output,
+			[col_note_id, col_note_type] + columns,
+			(export_row(record, type_names, columns) for record in records),
+		)
 
 		self.edit_export.setPlainText(output.getvalue())
+		self.tabs_export.setCurrentWidget(self.edit_export)
+
+		return
+
+	def export_csv_file(self) -> None:
+		"""
+		Exports the selected notes to a file in the chosen format, gzip-compressed if its name ends with ``.gz``.
+		The notes are fetched and written in chunks in the background, so memory stays bounded.
+
+		:return: ``None``
+		"""
+
+		selected_notes = self.browser.selectedNotes()
+		if not selected_notes:
+			showInfo("No notes selected.")
+			return
+
+		table_format = self.selected_format()
+		filter_plain, filter_gz, _ = file_filters(table_format)
+
+		path, file_filter = QFileDialog.getSaveFileName(
+			self, f"Export {table_format.name}", "", f"{filter_plain};;{filter_gz}"
+		)
+		if not path:
+			return
+
+		# Respect the chosen filter if the extension was omitted
+		if file_filter == filter_gz and not path.lower().endswith('.gz'):
+			path += table_format.extension + '.gz' if not path.lower().endswith(table_format.extension) else '.gz'
+
+		columns = self.selected_columns()
+		progress = BulkProgress(f"Exporting {table_format.name}...", len(selected_notes))
+
+		def op(col: Collection) -> int:
+
+			type_names = note_type_names(col)
+
+			def rows() -> Iterator[list]:
+				for record in iter_note_records(col, selected_notes, fields=columns):
+
+					# Stop on user request, keeping the rows written so far
+					if progress.cancelled:
+						return
+
+					progress.advance()
+					yield export_row(record, type_names, columns)
+
+			with open_table_file(path, 'w') as stream:
+				return table_format.write_rows(stream, [col_note_id, col_note_type] + columns, rows())
+
+		def on_success(count: int) -> None:
+
+			if progress.cancelled:
+				showInfo(f"Export cancelled, {count} of {len(selected_notes)} notes exported to:\n{path}")
+			else:
+				showInfo(f"{count} notes exported to:\n{path}")
+
+			return
+
+		run_bulk_query(self, progress, op, on_success)
 
 		return
 
@@ -274,37 +513,251 @@ class ModalCSVIO(QDialog):
 
 		csv_data = self.edit_import.toPlainText()
 		if not csv_data.strip():
-			showInfo("No CSV data provided.")
+			showInfo(f"No {self.selected_format().name} data provided.")
+			return
+
+		self.__run_import__(lambda: StringIO(csv_data))
+
+		return
+
+	def import_csv_file(self) -> None:
+		"""
+		Imports a file in the chosen format (gzip-compressed if its name ends with ``.gz``),
+		reading it incrementally instead of loading it in the text panel.
+
+		:return: ``None``
+		"""
+
+		table_format = self.selected_format()
+		filter_plain, filter_gz, filter_any = file_filters(table_format)
+
+		path, _ = QFileDialog.getOpenFileName(
+			self, f"Import {table_format.name}", "", f"{filter_any};;{filter_plain};;{filter_gz}"
+		)
+		if not path:
+			return
+
+		self.__run_import__(lambda: open_table_file(path))
+
+		return
+
+	def __run_import__(self, open_stream: Callable[[], TextIO]) -> None:
+		"""
+		Imports a table (headers included) in the chosen format into the selected notes, in the background.
+		The whole csv is validated first: if any row is malformed, or refers to a note that is not selected,
+		doesn't exist or is already edited by another row, the import is rejected before any note is written,
+		and the offending rows are reported.
+		Then, rows are read a chunk at a time, and the edited notes are saved in batches.
+		In diff-apply mode, only the notes whose fields differ from the csv are written.
+
+		:param open_stream: Opens a new stream over the csv, called once for each pass over it
+		:return: ``None``
+		"""
+
+		table_format = self.selected_format()
+		read_rows = table_format.read_rows
+
+		# Check the header before starting
+		try:
+			with open_stream() as stream:
+				headers, _ = read_rows(stream)
+		except TableFormatError as e:
+			showInfo(f"Invalid {table_format.name} format. {e}")
+			return
+
+		if not headers or col_note_id not in headers:
+			if table_format.header_row:
+				showInfo(f"Invalid {table_format.name} format. Ensure the header row has a '{col_note_id}' column.")
+			else:
+				showInfo(f"Invalid {table_format.name} format. Ensure the first line has a '{col_note_id}' key.")
+			return
+
+		note_id_index = headers.index(col_note_id)
+		note_type_index = headers.index(col_note_type) if col_note_type in headers else None
+
+		# Whether to write only the notes with different values
+		diff_apply = self.chk_diff_apply.isChecked()
+
+		# Notes the csv is allowed to edit
+		selected_ids = set(self.browser.selectedNotes())
+
+		# Validation counts
+		validation = SimpleNamespace(
+			rows=0,
+			invalid=0,
+		)
+		errors: List[str] = list()
+
+		def report_invalid(line_number: int, reason: str) -> None:
+			validation.invalid += 1
+			if len(errors) < IMPORT_MAX_ERRORS:
+				errors.append(f"Line {line_number}: {reason}")
+
+		validate_progress = BulkProgress(f"Validating {table_format.name}...", 0)
+
+		def validate_op(col: Collection) -> None:
+
+			# Lines of the rows with a well-formed id of a selected note, with their note type if given
+			row_ids: List[Tuple[int, NoteId, Optional[str]]] = list()
+
+			# Line of the row of each note id, a note can only be edited by one row
+			seen_ids: Dict[NoteId, int] = dict()
+
+			with open_stream() as stream:
+				_, rows = read_rows(stream)
+
+				try:
+					for line_number, row in rows:
+
+						# Stop on user request
+						if validate_progress.cancelled:
+							return
+
+						# Skip blank lines
+						if not row:
+							continue
+
+						validation.rows += 1
+						validate_progress.advance()
+
+						if len(row) != len(headers):
+							report_invalid(line_number, f"expected {len(headers)} columns, found {len(row)}")
+							continue
+
+						try:
+							note_id = NoteId(int(row[note_id_index]))
+						except ValueError:
+							report_invalid(line_number, f"invalid note id '{row[note_id_index]}'")
+							continue
+
+						if note_id not in selected_ids:
+							report_invalid(line_number, f"note {note_id} is not among the selected notes")
+							continue
+
+						if note_id in seen_ids:
+							report_invalid(line_number, f"note {note_id} is already in line {seen_ids[note_id]}")
+							continue
+
+						seen_ids[note_id] = line_number
+
+						type_name = row[note_type_index] if note_type_index is not None else None
+						row_ids.append((line_number, note_id, type_name))
+				except TableFormatError as e:
+					# Rows after a malformed one can't be read
+					report_invalid(e.line_number, e.reason)
+
+			# Check the notes exist and have the given type, in one query for the whole csv
+			note_types = note_type_ids(col, {note_id for _, note_id, _ in row_ids})
+			type_names = note_type_names(col)
+
+			for line_number, note_id, type_name in row_ids:
+				if note_id not in note_types:
+					report_invalid(line_number, f"note {note_id} not found")
+				elif type_name is not None and type_name != type_names.get(note_types[note_id]):
+					report_invalid(line_number, f"note {note_id} is not of type '{type_name}'")
+
 			return
 
-		input_stream = StringIO(csv_data)
-		reader = csv.reader(input_stream)
-		headers = next(reader, None)
+		# Import counts
+		counts = SimpleNamespace(
+			total=0,
+			updated=0,
+			unchanged=0,
+			unknown=0,
+		)
+
+		progress = BulkProgress(f"Importing {table_format.name}...", 0)
+
+		def op(col: Collection) -> OpChanges:
+
+			# Writer for the edited notes, all in a single undo entry
+			note_writer = NoteWriter(col, f"{table_format.name} Import")
+
+			with open_stream() as stream:
+				_, rows = read_rows(stream)
+
+				for chunk in iter_chunks(rows, READ_CHUNK_ROWS):
+
+					# Stop on user request, keeping the notes imported so far
+					if progress.cancelled:
+						break
+
+					# Rows have already been validated, skip blank lines
+					valid_rows = [
+						(NoteId(int(row[note_id_index])), row)
+						for _, row in chunk
+						if row
+					]
+					counts.total += len(valid_rows)
+
+					# Fetch the current contents of the notes, in one query for the whole chunk
+					records = iter_note_records(col, [note_id for note_id, _ in valid_rows], fields=headers)
+					records = {record.id: record for record in records}
+
+					# Edit the notes
+					for note_id, row in valid_rows:
+
+						# Deleted since the validation
+						record = records.get(note_id)
+						if record is None:
+							counts.unknown += 1
+							continue
+
+						# Keep only the values that differ from the note
+						edit = NoteEdit(record)
+						for i, field in enumerate(headers):
+							if field not in (col_note_id, col_note_type) and field in record.fields:
+								edit.set_field(field, row[i])
+
+						if edit.dirty or not diff_apply:
+							note_writer.add_edit(edit)
+							counts.updated += 1
+						else:
+							counts.unchanged += 1
+
+					progress.advance(len(valid_rows))
+
+			# Save the remaining notes and end undo checkpoint
+			return note_writer.finish()
+
+		def on_success(_: OpChanges) -> None:
+
+			info_msg = (
+				'Updated {updated} notes out of {total} rows\n'
+				'Unchanged notes (skipped): {unchanged}\n'
+				'Unknown note ids (skipped): {unknown}'
+			).format(**counts.__dict__)
+
+			if progress.cancelled:
+				info_msg = f'Import cancelled.\n\n{info_msg}'
+
+			showInfo(info_msg, title=f"{table_format.name} Import Results")
 
-		if not headers or "Note ID" not in headers:
-			showInfo("Invalid CSV format. Ensure 'Note ID' is included as the first column.")
 			return
 
-		# Start undo checkpoint
-		undo_id = mw.col.add_custom_undo_entry("CSV Import")
+		def on_validated(_: None) -> None:
 
-		# TODO: check if csv ids are in the selected notes
+			if validate_progress.cancelled:
+				showInfo("Import cancelled, no notes were changed.")
+				return
 
-		note_id_index = headers.index("Note ID")
-		for row in reader:
-			note_id = NoteId(int(row[note_id_index]))
-			note = mw.col.get_note(note_id)
-			for i, field in enumerate(headers):
-				if field != "Note ID" and field in note:
-					note[field] = row[i]
-			mw.col.update_note(note)
+			if validation.invalid:
+				info_msg = (
+					f'Import rejected, no notes were changed.\n'
+					f'Invalid rows: {validation.invalid} out of {validation.rows}\n\n'
+				)
+				info_msg += '\n'.join(errors)
+				if validation.invalid > len(errors):
+					info_msg += f'\n... and {validation.invalid - len(errors)} more'
 
-		# End undo checkpoint
-		mw.col.merge_undo_entries(undo_id)
+				showInfo(info_msg, title=f"{table_format.name} Import Results")
+				return
 
-		# Reset the collection and the main window
-		mw.reset()
+			progress.total = validation.rows
+			run_bulk_op(self, progress, op, on_success)
+
+			return
 
-		showInfo("Notes updated successfully.")
+		run_bulk_query(self, validate_progress, validate_op, on_validated)
 
 		return
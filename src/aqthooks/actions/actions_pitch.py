@@ -1,133 +1,129 @@
-import re
-from types import SimpleNamespace
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
-from aqt import mw
 from aqt.browser import Browser
-from aqt.utils import showInfo
 
-from ...pitch import find_pitch_graph_xml, infer_pitch_type_from_graph, apply_colour_to_field, PitchTypes
-from ...settings import AddonSettings
+from ..bulk_notes import NoteEdit, NoteRecord
+from ..bulk_operation import BulkOperation, CachedOperation, NoteFailed, register_operation
+from ...pitch import (
+	colour_fields_batch, PitchTypes, pitch_type_cache, PITCH_CODE_NONE, PITCH_PARSER_VERSION,
+)
+from ...utils import log
 
-# Regex for extracting the accent section
-re_accent = re.compile(r"<!-- (?:user_)?accent_start -->(.*)<!-- (?:user_)?accent_end -->")
 
-# Regex to check whether there's an accent section at the end
-re_accent_ends = re.compile(r"<!-- (?:user_)?accent_start -->.*?<!-- (?:user_)?accent_end -->$")
+@register_operation
+class ColourFromPitchOperation(CachedOperation, BulkOperation):
+	"""
+	Colour the fields based on the pitch graph.
+	"""
 
-# Regex to find all svg/circle tags
-re_tags = re.compile(r"</?(?:svg|circle).*?>")
+	key = "pitch"
+	menu_label = "Colour Fields from Pitch Graph"
+	undo_name = "Bulk Colour from Pitch Graph"
+	progress_label = "Colouring fields from pitch graph..."
+	results_title = "Bulk Colouring Results"
+	cache_kind = "pitch"
+	counters = (
+		("no_graph", "Notes without graph"),
+		("no_fields", "Notes without fields"),
+	)
 
-# Regex to find global font tag with colour
-re_font_color_start = re.compile(r"^<font color=\".*?\">(.*)$")
+	def __init__(self, browser: Browser):
 
+		super().__init__(browser)
 
-def aqt_colour_from_pitch_selcards(browser: Browser) -> None:
-	"""
-	Colour the fields based on the pitch graph.
+		self.conf = self.settings.pitch
+		self.tag_fail = self.conf.tag_fail
 
-	:param browser: browser object
-	"""
+		self.field_read = self.conf.field_reading
+		self.fields_tocolour = set(self.conf.fields_tocolour)
+		self.colours = {
+			PitchTypes.HEIBAN: self.conf.colour_heiban,
+			PitchTypes.ATAMADAKA: self.conf.colour_atamadaka,
+			PitchTypes.NAKADAKA: self.conf.colour_nakadaka,
+			PitchTypes.OODAKA: self.conf.colour_oodaka,
+		}
 
-	key_conf = mw.addonManager.getConfig(__name__)
-	conf = AddonSettings(key_conf).pitch
-
-	field_read = conf.field_reading
-	fields_tocolour = set(conf.fields_tocolour)
-	colours = {
-		PitchTypes.HEIBAN: conf.colour_heiban,
-		PitchTypes.ATAMADAKA: conf.colour_atamadaka,
-		PitchTypes.NAKADAKA: conf.colour_nakadaka,
-		PitchTypes.OODAKA: conf.colour_oodaka,
-	}
-
-	# Operation counts
-	counts = SimpleNamespace(
-		total=0,
-		edited=0,
-		no_graph=0,
-		no_fields=0,
-	)
+		return
+
+	def prepare(self) -> bool:
+
+		# Measure the pitch type cache on this run only
+		pitch_type_cache.reset_stats()
+
+		return True
+
+	def config(self) -> Dict[str, Any]:
+
+		return self.settings.json()["pitch"]
+
+	def fields(self) -> Iterable[str]:
+
+		return self.fields_tocolour | {self.field_read}
 
-	# Start undo checkpoint
-	undo_id = mw.col.add_custom_undo_entry("Bulk Colour from Pitch Graph")
+	def transform(self) -> Callable[[List[Any]], List[Any]]:
 
-	# Iterate over selected notes
-	for note_id in browser.selectedNotes():
+		# Colours the fields of a chunk of notes, in worker processes if enabled
+		return partial(colour_fields_batch, self.colours, self.conf.colour_graph)
 
-		# Increase total count
-		counts.total += 1
+	def select(self, record: NoteRecord) -> Tuple[str, Dict[str, str], Optional[int]]:
 
-		# Get note
-		note = mw.col.get_note(note_id)
+		return (
+			record.fields.get(self.field_read, ""),
+			{field: record.fields[field] for field in self.fields_tocolour if field in record.fields},
+			None,
+		)
 
-		# noinspection PyBroadException
-		try:
+	def edit(self, record: NoteRecord, result: Tuple[int, Dict[str, str]], edit: NoteEdit) -> None:
 
-			# Find input field
-			if not (field_read in note):
-				counts.no_fields += 1
-				raise Exception("No reading field")
+		pitch_code, coloured = result
 
-			# Find output fields
-			if not (fields_tocolour.issubset(note.keys())):
-				counts.no_fields += 1
-				raise Exception("Not all output fields found")
+		# Find input field
+		if not (self.field_read in record.fields):
+			raise NoteFailed("no_fields")
 
-			# Find root of accent svg
-			svg_root = find_pitch_graph_xml(note[field_read])
-			if svg_root is None:
-				counts.no_graph += 1
-				raise Exception("No graph found")
+		# Find output fields
+		if not (self.fields_tocolour.issubset(record.fields.keys())):
+			raise NoteFailed("no_fields")
 
-			# Find pitch type
-			pitch_type = infer_pitch_type_from_graph(svg_root)
-			if pitch_type is None:
-				counts.no_graph += 1
-				raise Exception("No graph found")
+		# Pitch type from the accent svg
+		if pitch_code == PITCH_CODE_NONE:
+			raise NoteFailed("no_graph")
 
-			colour = colours[pitch_type]
+		# Apply colour to the fields
+		for field, text in coloured.items():
+			edit.set_field(field, text)
 
-			# Apply colour to the fields
-			for field in fields_tocolour:
+		return
 
-				# Skip empty fields
-				text = note[field]
-				if not text:
-					continue
+	def cache_version(self) -> str:
 
-				note[field] = apply_colour_to_field(text, colour, colour_graph=conf.colour_graph)
+		return PITCH_PARSER_VERSION
 
-			# Increase edited count
-			counts.edited += 1
+	def cache_content(self, record: NoteRecord) -> Optional[str]:
 
-		except Exception:
+		return record.fields.get(self.field_read)
 
-			# Add fail tag to note
-			if conf.tag_fail:
-				note.add_tag(conf.tag_fail)
+	def cache_value(self, record: NoteRecord, result: Tuple[int, Dict[str, str]]) -> int:
 
-		finally:
+		# Pitch type code, or PITCH_CODE_NONE if the graph can't be classified
+		return result[0]
 
-			# Update the note
-			mw.col.update_note(note)
+	def cached_select(self, record: NoteRecord, value: int) -> Tuple[str, Dict[str, str], Optional[int]]:
 
-	# End undo checkpoint
-	mw.col.merge_undo_entries(undo_id)
+		# Only the classification is skipped, the fields are still coloured by the transform
+		reading, fields, _ = self.select(record)
 
-	# Reset the collection and the main window
-	mw.reset()
+		return reading, fields, value
 
-	# Final info message
-	info_msg = (
-		'「終わった」 (*￣▽￣)b\n\n'
-		'Edited {edited} notes out of {total} selected\n'
-		'Notes without graph: {no_graph}\n'
-		'Notes without fields: {no_fields}'
-	).format(**counts.__dict__)
+	def finished(self) -> None:
 
-	if counts.edited < counts.total:
-		info_msg += "\n\nTip: did you set the correct fields in the config?"
+		# Each worker process has its own cache, this one is unused
+		if self.settings.parallel_workers > 0:
+			return
 
-	showInfo(info_msg, title="Bulk Colouring Results")
+		log("Pitch type cache: {hits} hits, {misses} misses, {evictions} evictions, {size} entries".format(
+			**pitch_type_cache.stats()
+		))
 
-	return
+		return
@@ -1,96 +1,123 @@
-from types import SimpleNamespace
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
-from aqt import mw
 from aqt.browser import Browser
 from aqt.utils import showInfo
 
-from ...settings import AddonSettings
-from ...unpack import unpack_reading
+from ..bulk_notes import NoteEdit, NoteRecord
+from ..bulk_operation import BulkOperation, NoteFailed, register_operation
+from ...unpack import unpack_reading, unpack_batch, custom_format, FormatDetector
+from ...utils import log
 
 
-def aqt_unpack_reading_selected_cards(browser: Browser):
+@register_operation
+class UnpackReadingOperation(BulkOperation):
 	"""
-
-	:return:
+	Unpack the reading from the dictionary field into the reading field.
 	"""
 
-	dict_conf = mw.addonManager.getConfig(__name__)
-	conf = AddonSettings(dict_conf).unpack
+	key = "unpack"
+	menu_label = "Unpack Reading from Meaning"
+	undo_name = "Bulk Unpack Dictionary"
+	progress_label = "Unpacking readings from dictionary..."
+	results_title = "Reading Unpacking Results"
+	counters = (
+		("no_reading", "Notes without reading"),
+		("no_fields", "Notes without fields"),
+	)
+
+	def __init__(self, browser: Browser):
 
-	field_dict = conf.field_dictionary
-	field_read = conf.field_reading
+		super().__init__(browser)
 
-	# Operation counts
-	counts = SimpleNamespace(
-		total=0,
-		edited=0,
-		no_reading=0,
-		no_fields=0,
-	)
+		self.conf = self.settings.unpack
+		self.tag_fail = self.conf.tag_fail
 
-	# Start undo checkpoint
-	undo_id = mw.col.add_custom_undo_entry("Bulk Unpack Dictionary")
+		self.field_dict = self.conf.field_dictionary
+		self.field_read = self.conf.field_reading
 
-	# Iterate over selected notes
-	for note_id in browser.selectedNotes():
+		self.detector: Optional[FormatDetector] = None
 
-		# Increase total count
-		counts.total += 1
+		return
 
-		# Get note
-		note = mw.col.get_note(note_id)
+	def prepare(self) -> bool:
 
-		# noinspection PyBroadException
 		try:
+			custom_formats = [custom_format(pattern) for pattern in self.conf.custom_formats]
+		except ValueError as e:
+			showInfo(f"Invalid custom format in the config.\n\n{e}")
+			return False
+
+		# Formats are detected per note type, custom formats first, the built-in ones alone are matched in one scan
+		if custom_formats:
+			self.detector = FormatDetector(custom_formats)
+
+		return True
+
+	def config(self) -> Dict[str, Any]:
+
+		return self.settings.json()["unpack"]
+
+	def fields(self) -> Iterable[str]:
+
+		return [self.field_dict, self.field_read]
+
+	def transform(self) -> Callable[[List[Any]], List[Any]]:
+
+		# Workers can't share the detected formats, they try every format on each note
+		if self.detector is None or self.settings.parallel_workers > 0:
+			return partial(unpack_batch, tuple(self.conf.custom_formats))
+
+		return self.__unpack_records__
+
+	def select(self, record: NoteRecord) -> Any:
 
-			# Find i/o fields
-			if not (field_dict in note and field_read in note):
-				counts.no_fields += 1
-				raise Exception("No fields found")
+		if self.detector is None or self.settings.parallel_workers > 0:
+			return record.fields.get(self.field_dict, "")
 
-			# Unpack the fields
-			reading, meaning = unpack_reading(note[field_dict])
+		return record
 
-			# Check if no reading
-			if reading == "":
-				counts.no_reading += 1
-				raise Exception("No reading found")
+	def edit(self, record: NoteRecord, result: Tuple[str, str], edit: NoteEdit) -> None:
 
-			# Update the fields
-			note[field_read] = reading
-			note[field_dict] = meaning
+		reading, meaning = result
 
-			# Increase edited count
-			counts.edited += 1
+		# Find i/o fields
+		if not (self.field_dict in record.fields and self.field_read in record.fields):
+			raise NoteFailed("no_fields")
 
-		except Exception:
+		# Check if no reading
+		if reading == "":
+			raise NoteFailed("no_reading")
 
-			# Add fail tag to note
-			if conf.tag_fail:
-				note.add_tag(conf.tag_fail)
+		# Update the fields
+		edit.set_field(self.field_read, reading)
+		edit.set_field(self.field_dict, meaning)
 
-		finally:
+		return
 
-			# Update the note
-			mw.col.update_note(note)
+	def finished(self) -> None:
 
-	# End undo checkpoint
-	mw.col.merge_undo_entries(undo_id)
+		if self.detector is None:
+			return
 
-	# Reset the collection and the main window
-	mw.reset()
+		log("Dictionary formats: {pinned} note types pinned, {hits} notes matched, {fallbacks} fallbacks".format(
+			**self.detector.stats()
+		))
 
-	# Final info message
-	info_msg = (
-		'「終わった」 (*￣▽￣)b\n\n'
-		'Edited {edited} notes out of {total} selected\n'
-		'Notes without reading: {no_reading}\n'
-		'Notes without fields: {no_fields}'
-	).format(**counts.__dict__)
+		return
 
-	if counts.edited < counts.total:
-		info_msg += "\n\nTip: did you set the correct fields in the config?"
+	def __unpack_records__(self, records: List[NoteRecord]) -> List[Tuple[str, str]]:
+		"""
+		Unpacks a chunk of notes in this process, with the formats detected for their note types.
 
-	showInfo(info_msg, title="Reading Unpacking Results")
+		:param records: The records of the notes
+		:return: The reading and the meaning of each note
+		"""
 
-	return
+		return [
+			unpack_reading(
+				record.fields.get(self.field_dict, ""),
+				lambda expression, mid=record.mid: self.detector.find_reading(mid, expression),
+			)
+			for record in records
+		]
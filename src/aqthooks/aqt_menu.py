@@ -3,9 +3,9 @@ from typing import Optional
 from aqt.browser import Browser
 from aqt.qt import QAction
 
+from .actions import actions_unpack, actions_pitch  # noqa: F401, registers the bulk operations
 from .actions.actions_csv import aqt_show_csv_io
-from .actions.actions_pitch import aqt_colour_from_pitch_selcards
-from .actions.actions_unpack import aqt_unpack_reading_selected_cards
+from .bulk_operation import BULK_OPERATIONS
 from ..utils import log, reload_scripts
 
 
@@ -21,13 +21,18 @@ def aqt_build_menus(browser: Browser) -> None:
 	title_action = QAction("Sky's Jouzu BulkOps", browser)
 	title_action.setEnabled(False)
 
-	# Unpack Reading from Meaning
-	unpack_action = QAction("Unpack Reading from Meaning", browser)
-	unpack_action.triggered.connect(lambda: aqt_unpack_reading_selected_cards(browser))
+	# Bulk operations, in registration order
+	operation_actions = list()
+	for operation in BULK_OPERATIONS:
+		action = QAction(operation.menu_label, browser)
+		action.triggered.connect(lambda _=False, op=operation: op(browser).run())
+		operation_actions.append(action)
 
-	# Colour Fields from Pitch Graph
-	colour_action = QAction("Colour Fields from Pitch Graph", browser)
-	colour_action.triggered.connect(lambda: aqt_colour_from_pitch_selcards(browser))
+	# Previews of the bulk operations, without writing until confirmed
+	for operation in BULK_OPERATIONS:
+		action = QAction(f"Preview {operation.menu_label}...", browser)
+		action.triggered.connect(lambda _=False, op=operation: op(browser).preview())
+		operation_actions.append(action)
 
 	# CSV I/O from External CSV
 	csv_action = QAction("CSV I/O from External CSV", browser)
@@ -39,8 +44,7 @@ def aqt_build_menus(browser: Browser) -> None:
 
 	actions = [
 		title_action,
-		unpack_action,
-		colour_action,
+		*operation_actions,
 		csv_action,
 		# config_action,
 	]
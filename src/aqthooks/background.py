@@ -0,0 +1,172 @@
+import time
+from typing import Any, Callable, Optional, TypeVar
+
+from anki.collection import Collection, OpChanges, Progress
+from aqt import mw
+from aqt.operations import CollectionOp, QueryOp
+from aqt.progress import ProgressUpdate
+from aqt.qt import QPushButton, QWidget
+
+PROGRESS_REFRESH_SECS = 0.1
+""" Minimum interval between two throughput samples """
+
+T = TypeVar('T')
+
+
+class BulkProgress:
+	"""
+	Progress of a bulk operation running in the background.
+	The operation advances it from the background thread,
+	while Anki's progress dialog polls it from the main thread.
+	"""
+
+	def __init__(self, label: str, total: int):
+		"""
+		Initializes the progress of an operation.
+
+		:param label: The label shown above the progress bar
+		:param total: The number of notes to process, 0 if unknown
+		"""
+
+		self.label = label
+		self.total = total
+		self.done = 0
+		self.cancelled = False
+
+		self.start_time = time.monotonic()
+		self.rate = 0.0
+		self.last_sample = (self.start_time, 0)
+
+		self.btn_cancel: Optional[QPushButton] = None
+
+		return
+
+	def advance(self, count: int = 1) -> None:
+		"""
+		Marks some notes as processed. Called from the background thread.
+
+		:param count: The number of notes processed
+		:return: ``None``
+		"""
+
+		self.done += count
+
+		return
+
+	@property
+	def elapsed(self) -> float:
+		"""
+		:return: The seconds elapsed since the operation started
+		"""
+
+		return time.monotonic() - self.start_time
+
+	def text(self) -> str:
+		"""
+		:return: The label followed by the processed notes count and the throughput
+		"""
+
+		if not self.total:
+			return f'{self.label}\n{self.done:,} notes ({self.rate:,.0f} notes/s)'
+
+		return f'{self.label}\n{self.done:,} / {self.total:,} notes ({self.rate:,.0f} notes/s)'
+
+	def __on_progress__(self, _: Progress, update: ProgressUpdate) -> None:
+		"""
+		Called periodically on the main thread while the operation runs, to refresh the progress dialog.
+
+		:param _: The backend progress (unused, the operation runs python-side)
+		:param update: The update to apply to the progress dialog
+		:return: ``None``
+		"""
+
+		self.__add_cancel_button__()
+
+		if update.user_wants_abort:
+			self.cancelled = True
+
+		# Sample throughput
+		now = time.monotonic()
+		last_time, last_done = self.last_sample
+		if now - last_time >= PROGRESS_REFRESH_SECS:
+			self.rate = (self.done - last_done) / (now - last_time)
+			self.last_sample = (now, self.done)
+
+		update.label = self.text() if not self.cancelled else f'{self.label}\nCancelling...'
+		update.value = self.done
+		update.max = self.total
+
+		return
+
+	def __add_cancel_button__(self) -> None:
+		"""
+		Adds a Cancel button to Anki's progress dialog, which only supports cancelling
+		through its close button or the Escape key.
+
+		:return: ``None``
+		"""
+
+		if self.btn_cancel is not None:
+			return
+
+		dialog = getattr(mw.progress, '_win', None)
+		layout = getattr(getattr(dialog, 'form', None), 'verticalLayout', None)
+		if dialog is None or layout is None:
+			return
+
+		# Closing the dialog doesn't close it, it flags it as cancelled
+		self.btn_cancel = QPushButton('Cancel')
+		self.btn_cancel.clicked.connect(dialog.close)
+		layout.addWidget(self.btn_cancel)
+
+		return
+
+
+def run_bulk_op(
+		parent: QWidget,
+		progress: BulkProgress,
+		op: Callable[[Collection], OpChanges],
+		on_success: Callable[[OpChanges], Any],
+) -> None:
+	"""
+	Runs a collection operation in the background, showing its progress with a Cancel button.
+	The operation should stop early and return its changes when ``progress.cancelled`` is set.
+	The returned changes are broadcast to the open screens, which refresh only what the changes affect
+	(e.g. the browser redraws its rows), so there is no need to reset the main window.
+
+	:param parent: The parent widget of the progress dialog
+	:param progress: The progress advanced by the operation
+	:param op: The operation, called with the collection on a background thread
+	:param on_success: Called on the main thread with the changes of the operation
+	:return: ``None``
+	"""
+
+	collection_op = CollectionOp(parent, op).success(on_success)
+	collection_op.with_backend_progress(progress.__on_progress__)
+	collection_op.run_in_background()
+
+	return
+
+
+def run_bulk_query(
+		parent: QWidget,
+		progress: BulkProgress,
+		op: Callable[[Collection], T],
+		on_success: Callable[[T], Any],
+) -> None:
+	"""
+	Runs a read-only operation in the background, showing its progress with a Cancel button.
+	The operation should stop early when ``progress.cancelled`` is set.
+
+	:param parent: The parent widget of the progress dialog
+	:param progress: The progress advanced by the operation
+	:param op: The operation, called with the collection on a background thread
+	:param on_success: Called on the main thread with the result of the operation
+	:return: ``None``
+	"""
+
+	query_op = QueryOp(parent=parent, op=op, success=on_success)
+	query_op.with_backend_progress(progress.__on_progress__)
+	query_op.run_in_background()
+
+	return
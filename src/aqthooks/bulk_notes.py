@@ -0,0 +1,353 @@
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from anki.collection import Collection, OpChanges
+from anki.models import NotetypeId
+from anki.notes import Note, NoteId
+from anki.utils import ids2str, split_fields
+
+DEFAULT_CHUNK_SIZE = 500
+""" Number of notes fetched from the collection in a single query """
+
+
+class NoteRecord(NamedTuple):
+	"""
+	Lightweight, read-only view of a note, holding only the fields needed by an operation.
+	"""
+
+	id: NoteId
+	mid: NotetypeId
+	mod: int
+	tags: List[str]
+	fields: Dict[str, str]
+	""" Requested fields the note has, by name """
+
+	def has_tag(self, tag: str) -> bool:
+		"""
+		Checks whether the note has a tag (case-insensitive, like ``Note.has_tag``).
+
+		:param tag: The tag to look for
+		:return: ``True`` if the note has the tag, ``False`` otherwise
+		"""
+
+		tag = tag.lower()
+
+		return any(note_tag.lower() == tag for note_tag in self.tags)
+
+
+class NoteEdit:
+	"""
+	Changes to apply to a note, built while transforming its record.
+	Only values that differ from the record are kept, so an edit without changes is not dirty.
+	"""
+
+	def __init__(self, record: NoteRecord):
+		"""
+		Initializes an empty edit for the given record.
+
+		:param record: The record of the note to edit
+		"""
+
+		self.record = record
+		self.fields: Dict[str, str] = dict()
+		self.tags: List[str] = list()
+
+		return
+
+	@property
+	def dirty(self) -> bool:
+		"""
+		:return: ``True`` if the edit changes the note, ``False`` otherwise
+		"""
+
+		return bool(self.fields or self.tags)
+
+	def set_field(self, field: str, value: str) -> None:
+		"""
+		Sets the value of a field, only if it differs from the current one.
+
+		:param field: The name of the field
+		:param value: The new value of the field
+		:return: ``None``
+		"""
+
+		if self.record.fields[field] == value:
+			self.fields.pop(field, None)
+		else:
+			self.fields[field] = value
+
+		return
+
+	def add_tag(self, tag: str) -> None:
+		"""
+		Adds a tag, only if the tag is not empty and the note doesn't have it yet.
+
+		:param tag: The tag to add
+		:return: ``None``
+		"""
+
+		if tag and not self.record.has_tag(tag) and tag not in self.tags:
+			self.tags.append(tag)
+
+		return
+
+	def apply(self, note: Note) -> None:
+		"""
+		Applies the changes to the given note, without saving it.
+
+		:param note: The note to edit, with the same id as the record
+		:return: ``None``
+		"""
+
+		for field, value in self.fields.items():
+			note[field] = value
+
+		for tag in self.tags:
+			note.add_tag(tag)
+
+		return
+
+
+def chunked(items: Sequence, chunk_size: int) -> Iterator[Sequence]:
+	"""
+	Splits a sequence into consecutive chunks.
+
+	:param items: The sequence to split
+	:param chunk_size: The maximum size of each chunk
+	:return: An iterator over the chunks
+	"""
+
+	for i in range(0, len(items), chunk_size):
+		yield items[i:i + chunk_size]
+
+
+def iter_note_records(
+		col: Collection,
+		note_ids: Sequence[NoteId],
+		fields: Optional[Iterable[str]] = None,
+		chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[NoteRecord]:
+	"""
+	Fetches the notes with the given ids, a chunk at a time, with a single query per chunk.
+	The records are yielded in the same order as the ids; ids without a note are skipped.
+
+	:param col: The collection to read from
+	:param note_ids: The ids of the notes to fetch
+	:param fields: The names of the fields to fetch, ``None`` for all of them
+	:param chunk_size: The number of notes fetched per query
+	:return: An iterator over the records of the notes
+	"""
+
+	fields = set(fields) if fields is not None else None
+
+	# Requested field names and positions, per note type
+	model_fields: Dict[NotetypeId, List[Tuple[str, int]]] = dict()
+
+	for chunk in chunked(note_ids, chunk_size):
+
+		rows = col.db.all(f"select id, mid, mod, tags, flds from notes where id in {ids2str(chunk)}")
+		rows = {row[0]: row for row in rows}
+
+		for note_id in chunk:
+
+			row = rows.get(note_id)
+			if row is None:
+				continue
+
+			_, mid, mod, tags, flds = row
+
+			if mid not in model_fields:
+				model_fields[mid] = __model_field_ords__(col, mid, fields)
+
+			values = split_fields(flds)
+
+			yield NoteRecord(
+				id=NoteId(note_id),
+				mid=NotetypeId(mid),
+				mod=mod,
+				tags=tags.split(),
+				fields={name: values[ord_] for name, ord_ in model_fields[mid] if ord_ < len(values)},
+			)
+
+	return
+
+
+def count_notes_by_model(col: Collection, note_ids: Sequence[NoteId]) -> Dict[NotetypeId, int]:
+	"""
+	Counts the notes of each note type among the given notes, with a single aggregate query.
+
+	:param col: The collection to read from
+	:param note_ids: The ids of the notes to count
+	:return: The number of notes for each note type id
+	"""
+
+	if not note_ids:
+		return dict()
+
+	rows = col.db.all(f"select mid, count() from notes where id in {ids2str(note_ids)} group by mid")
+
+	return {NotetypeId(mid): count for mid, count in rows}
+
+
+def note_type_ids(col: Collection, note_ids: Iterable[NoteId]) -> Dict[NoteId, NotetypeId]:
+	"""
+	Finds the note type of the given notes, with a single query.
+	Ids that don't belong to a note are left out, so this also checks which notes exist.
+
+	:param col: The collection to read from
+	:param note_ids: The ids of the notes
+	:return: The note type id of each existing note
+	"""
+
+	note_ids = list(note_ids)
+	if not note_ids:
+		return dict()
+
+	rows = col.db.all(f"select id, mid from notes where id in {ids2str(note_ids)}")
+
+	return {NoteId(note_id): NotetypeId(mid) for note_id, mid in rows}
+
+
+def note_mods(col: Collection, note_ids: Iterable[NoteId]) -> Dict[NoteId, int]:
+	"""
+	Finds the modification time of the given notes, with a single query.
+	Ids that don't belong to a note are left out.
+
+	:param col: The collection to read from
+	:param note_ids: The ids of the notes
+	:return: The modification time of each existing note
+	"""
+
+	note_ids = list(note_ids)
+	if not note_ids:
+		return dict()
+
+	rows = col.db.all(f"select id, mod from notes where id in {ids2str(note_ids)}")
+
+	return {NoteId(note_id): mod for note_id, mod in rows}
+
+
+def note_type_names(col: Collection) -> Dict[NotetypeId, str]:
+	"""
+	:param col: The collection to read from
+	:return: The name of every note type of the collection, by id
+	"""
+
+	return {NotetypeId(entry.id): entry.name for entry in col.models.all_names_and_ids()}
+
+
+def __model_field_ords__(col: Collection, mid: NotetypeId, fields: Optional[set]) -> List[Tuple[str, int]]:
+	"""
+	Returns the names and positions of the requested fields of a note type.
+
+	:param col: The collection containing the note type
+	:param mid: The id of the note type
+	:param fields: The names of the fields to keep, ``None`` for all of them
+	:return: The list of (name, position) of the fields the note type has
+	"""
+
+	model = col.models.get(mid)
+	if not model:
+		return []
+
+	return [
+		(fld["name"], fld["ord"])
+		for fld in model["flds"]
+		if fields is None or fld["name"] in fields
+	]
+
+
+class NoteWriter:
+	"""
+	Accumulates edited notes and saves them with bulk ``update_notes`` calls, a chunk at a time.
+	Notes are batched per note type, so each call only saves notes of a single type.
+	All the writes are merged into a single undo entry, opened when the writer is created.
+	"""
+
+	def __init__(self, col: Collection, undo_name: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+		"""
+		Initializes the writer and opens its undo entry.
+
+		:param col: The collection to write to
+		:param undo_name: The name of the undo entry
+		:param chunk_size: The number of notes saved per ``update_notes`` call
+		"""
+
+		self.col = col
+		self.chunk_size = chunk_size
+		self.pending: Dict[NotetypeId, List[Note]] = dict()
+		self.written = 0
+
+		# Start undo checkpoint
+		self.undo_id = col.add_custom_undo_entry(undo_name)
+
+		return
+
+	def add_edit(self, edit: NoteEdit) -> None:
+		"""
+		Loads the note of an edit, applies the changes and queues it for saving.
+
+		:param edit: The edit to write
+		:return: ``None``
+		"""
+
+		note = self.col.get_note(edit.record.id)
+		edit.apply(note)
+		self.add_note(note)
+
+		return
+
+	def add_note(self, note: Note) -> None:
+		"""
+		Queues an edited note for saving, saving the queued notes of its type if their chunk is full.
+
+		:param note: The edited note
+		:return: ``None``
+		"""
+
+		batch = self.pending.setdefault(note.mid, list())
+		batch.append(note)
+
+		if len(batch) >= self.chunk_size:
+			self.__save__(batch)
+			del self.pending[note.mid]
+
+		return
+
+	def flush(self) -> None:
+		"""
+		Saves the queued notes, one note type at a time.
+
+		:return: ``None``
+		"""
+
+		for batch in self.pending.values():
+			self.__save__(batch)
+
+		self.pending = dict()
+
+		return
+
+	def __save__(self, notes: List[Note]) -> None:
+		"""
+		Saves a batch of notes with a single call.
+
+		:param notes: The notes to save
+		:return: ``None``
+		"""
+
+		self.col.update_notes(notes)
+		self.written += len(notes)
+
+		return
+
+	def finish(self) -> OpChanges:
+		"""
+		Saves the queued notes and closes the undo entry, merging every write into it.
+
+		:return: The changes of the whole operation
+		"""
+
+		self.flush()
+
+		# End undo checkpoint
+		return self.col.merge_undo_entries(self.undo_id)
@@ -0,0 +1,742 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, TypeVar
+
+from anki.collection import Collection, OpChanges
+from anki.notes import NoteId
+from aqt import mw
+from aqt.browser import Browser
+from aqt.utils import showInfo
+
+from .background import BulkProgress, run_bulk_op, run_bulk_query
+from .bulk_notes import iter_note_records, note_mods, NoteEdit, NoteRecord, NoteWriter, DEFAULT_CHUNK_SIZE
+from .edit_preview import ModalEditPreview
+from ..parallel import map_batches
+from ..result_cache import ResultCache
+from ..settings import AddonSettings
+from ..table_io import iter_chunks
+from ..utils import log
+from ..watermarks import modified_note_ids, WatermarkStore
+
+T = TypeVar('T')
+
+WATERMARKS_FILE_NAME = "watermarks.sqlite"
+""" Name of the file recording the notes processed by each operation, in the user files of the addon """
+
+CACHE_FILE_NAME = "cache.sqlite"
+""" Name of the file of the persistent result cache, in the user files of the addon """
+
+BULK_OPERATIONS: List[Type['BulkOperation']] = list()
+""" Registered bulk operations, in the order they appear in the browser menus """
+
+
+def register_operation(operation: Type['BulkOperation']) -> Type['BulkOperation']:
+	"""
+	Class decorator adding a bulk operation to the browser menus.
+
+	:param operation: The class of the operation
+	:return: The same class
+	"""
+
+	BULK_OPERATIONS.append(operation)
+
+	return operation
+
+
+class NoteFailed(Exception):
+	"""
+	Raised while editing a note that the operation can't process: the note is tagged with the fail tag.
+	"""
+
+	def __init__(self, counter: str):
+		"""
+		:param counter: The name of the counter of the failure, see ``BulkOperation.counters``
+		"""
+
+		super().__init__(counter)
+		self.counter = counter
+
+
+class CachedOperation(ABC):
+	"""
+	Mixin of the bulk operations caching their results on disk, keyed by the content they depend on,
+	to be inherited before ``BulkOperation``. Only the cached values are stored, the transform still
+	runs on the notes with a cached value, skipping their parsing.
+	"""
+
+	cache_kind = ""
+	""" Kind of the results of the operation in the persistent cache """
+
+	@abstractmethod
+	def cache_version(self) -> str:
+		"""
+		:return: The version of the cached results, the cached results of other versions are discarded
+		"""
+
+		raise NotImplementedError
+
+	@abstractmethod
+	def cache_content(self, record: NoteRecord) -> Optional[str]:
+		"""
+		:param record: The record of a note
+		:return: The content the result of the note depends on, ``None`` to not cache it
+		"""
+
+		raise NotImplementedError
+
+	@abstractmethod
+	def cache_value(self, record: NoteRecord, result: Any) -> Any:
+		"""
+		:param record: The record of a note
+		:param result: The result of the transform for the note
+		:return: The part of the result to cache, serializable to json
+		"""
+
+		raise NotImplementedError
+
+	@abstractmethod
+	def cached_select(self, record: NoteRecord, value: Any) -> Any:
+		"""
+		Returns the value of a note passed to the transform when its cached value is known,
+		so the transform, in worker processes if enabled, can skip the parsing.
+
+		:param record: The record of a note
+		:param value: The cached value, see ``cache_value``
+		:return: The value of the note passed to the transform
+		"""
+
+		raise NotImplementedError
+
+
+class BulkOperation(ABC):
+	"""
+	Base class of the operations editing the notes selected in the browser.
+	The notes are processed in the background by a streaming pipeline with three stages:
+	fetch (the records of the notes, a chunk at a time), transform (a pure function over a chunk of records,
+	possibly run in worker processes), and write (the edits, saved in batches within a single undo entry).
+	Subclasses define the fields to fetch, the transform, and how a transform result edits a note;
+	the counters, the timing of each stage, the progress and the final summary are shared.
+	Subclasses also inheriting ``CachedOperation`` cache their results on disk.
+	"""
+
+	key = ""
+	""" Identifier of the operation, under which the notes it processed are recorded """
+
+	menu_label = ""
+	""" Label of the operation in the browser menus """
+
+	undo_name = ""
+	""" Name of the undo entry of the operation """
+
+	progress_label = ""
+	""" Label of the progress dialog """
+
+	results_title = ""
+	""" Title of the summary dialog """
+
+	counters: Tuple[Tuple[str, str], ...] = ()
+	""" Failure counters of the operation, as (name, label in the summary) """
+
+	chunk_size = DEFAULT_CHUNK_SIZE
+	""" Number of notes fetched, transformed and saved at once """
+
+	def __init__(self, browser: Browser):
+		"""
+		Initializes the operation, loading the settings. The selection is read when the operation runs.
+
+		:param browser: The browser with the selected notes
+		"""
+
+		self.browser = browser
+		self.settings = AddonSettings(mw.addonManager.getConfig(__name__))
+
+		# Tag added to the notes that can't be processed
+		self.tag_fail = ""
+
+		self.note_ids: Sequence[NoteId] = list()
+		self.progress: Optional[BulkProgress] = None
+
+		# Edits computed by the preview
+		self.edits: List[NoteEdit] = list()
+
+		# Modification time of the processed notes after their processing, for the incremental mode
+		self.processed_mods: Dict[NoteId, int] = dict()
+
+		# Cached results of the notes being processed, and new results to cache
+		addon = mw.addonManager.addonFromModule(__name__)
+		self.cache_path = os.path.join(mw.addonManager.addonsFolder(addon), "user_files", CACHE_FILE_NAME)
+		self.watermarks_path = os.path.join(mw.addonManager.addonsFolder(addon), "user_files", WATERMARKS_FILE_NAME)
+		self.cached: Dict[NoteId, Any] = dict()
+		self.cache_pending: List[Tuple[str, Any]] = list()
+
+		self.counts: Dict[str, int] = dict.fromkeys(
+			("total", "edited", "unchanged", "failed", "stale", "unmodified") + tuple(name for name, _ in self.counters), 0
+		)
+		self.timings: Dict[str, float] = dict.fromkeys(("fetch", "transform", "write"), 0.0)
+
+		return
+
+	def prepare(self) -> bool:
+		"""
+		Called on the main thread before running the operation.
+
+		:return: ``False`` to cancel the operation, ``True`` otherwise
+		"""
+
+		return True
+
+	@abstractmethod
+	def config(self) -> Dict[str, Any]:
+		"""
+		Returns the settings the results of the operation depend on.
+		When they change, the notes processed by the operation are forgotten and every selected note is processed again.
+
+		:return: The settings, serializable to json
+		"""
+
+		raise NotImplementedError
+
+	def config_hash(self) -> str:
+		"""
+		:return: The hash of the settings of the operation, see ``config``
+		"""
+
+		data = json.dumps(self.config(), sort_keys=True, ensure_ascii=False)
+
+		return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+	@abstractmethod
+	def fields(self) -> Iterable[str]:
+		"""
+		:return: The names of the fields to fetch
+		"""
+
+		raise NotImplementedError
+
+	@abstractmethod
+	def transform(self) -> Callable[[List[Any]], List[Any]]:
+		"""
+		Returns the transform stage, from the selected values of a chunk of notes to their results.
+		To run in worker processes, it must be picklable (see ``map_batches``).
+
+		:return: The transform
+		"""
+
+		raise NotImplementedError
+
+	def select(self, record: NoteRecord) -> Any:
+		"""
+		:param record: The record of a note
+		:return: The value of the note passed to the transform, the record itself by default
+		"""
+
+		return record
+
+	@abstractmethod
+	def edit(self, record: NoteRecord, result: Any, edit: NoteEdit) -> None:
+		"""
+		Edits a note with the result of the transform.
+
+		:param record: The record of the note
+		:param result: The result of the transform for the note
+		:param edit: The edit of the note, written only if dirty
+		:return: ``None``
+		:raises NoteFailed: If the note can't be processed
+		"""
+
+		raise NotImplementedError
+
+	def finished(self) -> None:
+		"""
+		Called on the main thread after the operation, before showing the summary.
+
+		:return: ``None``
+		"""
+
+		return
+
+	def count_lines(self) -> List[str]:
+		"""
+		:return: The counts of the operation, one per line
+		"""
+
+		lines = [f'Edited {self.counts["edited"]} notes out of {self.counts["total"]} selected']
+		lines += [f'{label}: {self.counts[name]}' for name, label in self.counters]
+		lines.append(f'Notes left unchanged: {self.counts["unchanged"]}')
+
+		if self.counts["unmodified"]:
+			lines.append(f'Notes skipped, not modified since last processed: {self.counts["unmodified"]}')
+
+		if self.counts["stale"]:
+			lines.append(f'Notes skipped, edited after the preview: {self.counts["stale"]}')
+
+		return lines
+
+	def summary(self) -> str:
+		"""
+		:return: The summary of the operation, shown at the end
+		"""
+
+		lines = ['「終わった」 (*￣▽￣)b', ''] + self.count_lines()
+
+		if self.progress.cancelled:
+			lines += ['', f'Cancelled after {self.progress.done} of {self.progress.total} notes.']
+		elif self.counts["failed"]:
+			lines += ['', 'Tip: did you set the correct fields in the config?']
+
+		return '\n'.join(lines)
+
+	def run(self) -> None:
+		"""
+		Runs the operation on the selected notes, in the background.
+
+		:return: ``None``
+		"""
+
+		if not self.prepare():
+			return
+
+		# Selection must be read on the main thread
+		self.note_ids = self.browser.selectedNotes()
+		self.progress = BulkProgress(self.progress_label, len(self.note_ids))
+
+		run_bulk_op(self.browser, self.progress, self.__op__, self.__on_success__)
+
+		return
+
+	def preview(self) -> None:
+		"""
+		Computes the edits of the selected notes in the background, without writing them,
+		then shows them for review. Applying them from the preview writes the computed edits as they are.
+
+		:return: ``None``
+		"""
+
+		if not self.prepare():
+			return
+
+		# Selection must be read on the main thread
+		self.note_ids = self.browser.selectedNotes()
+		self.progress = BulkProgress(f'{self.progress_label} (preview)', len(self.note_ids))
+
+		run_bulk_query(self.browser, self.progress, self.__preview__, self.__on_preview__)
+
+		return
+
+	def apply(self) -> None:
+		"""
+		Writes the edits computed by ``preview``, in the background.
+
+		:return: ``None``
+		"""
+
+		self.progress = BulkProgress(f'Writing {len(self.edits)} previewed notes...', len(self.edits))
+
+		run_bulk_op(self.browser, self.progress, self.__apply__, self.__on_success__)
+
+		return
+
+	def __edits__(self, col: Collection) -> Iterator[NoteEdit]:
+		"""
+		Runs the fetch and transform stages, counting the notes.
+
+		:param col: The collection
+		:return: An iterator over the edits that change their note
+		"""
+
+		self.processed_mods = dict()
+
+		note_ids = self.__modified_note_ids__(col) if self.settings.incremental else self.note_ids
+
+		records = iter_note_records(col, note_ids, fields=self.fields(), chunk_size=self.chunk_size)
+		records = self.__timed__(records, "fetch")
+
+		transform = self.transform()
+		select = self.select
+
+		# Notes with a cached result are transformed with it, skipping their parsing
+		cache = self.__open_cache__()
+		if cache is not None:
+			records = self.__cache_lookup__(records, cache)
+			select = self.__select_cached__
+
+		results = map_batches(
+			transform, records, select, workers=self.settings.parallel_workers, chunk_size=self.chunk_size
+		)
+		results = self.__timed__(results, "transform")
+
+		try:
+			for record, result in results:
+
+				# Stop on user request, keeping the notes processed so far
+				if self.progress.cancelled:
+					break
+
+				self.counts["total"] += 1
+				self.progress.advance()
+				self.processed_mods[record.id] = record.mod
+
+				start = time.perf_counter()
+
+				if cache is not None:
+					self.__cache_result__(record, result, cache)
+
+				# Changes to write on the note
+				edit = NoteEdit(record)
+
+				# noinspection PyBroadException
+				try:
+					self.edit(record, result, edit)
+
+				except Exception as e:
+
+					self.counts["failed"] += 1
+					if isinstance(e, NoteFailed):
+						self.counts[e.counter] += 1
+
+					# Add fail tag to note
+					edit.add_tag(self.tag_fail)
+
+				else:
+
+					# Only the notes actually changed count as edited
+					if edit.dirty:
+						self.counts["edited"] += 1
+
+				self.timings["transform"] += time.perf_counter() - start
+
+				# Update the note, only if something changed
+				if edit.dirty:
+					yield edit
+				else:
+					self.counts["unchanged"] += 1
+
+		finally:
+			results.close()
+
+			if cache is not None:
+				self.__close_cache__(cache)
+
+			# Fetching happens while waiting for the transform results
+			self.timings["transform"] -= self.timings["fetch"]
+
+		return
+
+	def __op__(self, col: Collection) -> OpChanges:
+		"""
+		Runs the pipeline, on a background thread.
+
+		:param col: The collection
+		:return: The changes of the operation
+		"""
+
+		# Writer for the edited notes, all in a single undo entry
+		writer = NoteWriter(col, self.undo_name, self.chunk_size)
+		written: List[NoteId] = list()
+
+		for edit in self.__edits__(col):
+			start = time.perf_counter()
+			writer.add_edit(edit)
+			written.append(edit.record.id)
+			self.timings["write"] += time.perf_counter() - start
+
+		# Save the remaining notes and end undo checkpoint
+		start = time.perf_counter()
+		changes = writer.finish()
+		self.timings["write"] += time.perf_counter() - start
+
+		self.__save_watermark__(col, written)
+
+		return changes
+
+	def __preview__(self, col: Collection) -> List[NoteEdit]:
+		"""
+		Runs the fetch and transform stages, on a background thread.
+
+		:param col: The collection
+		:return: The edits that change their note
+		"""
+
+		self.edits = list(self.__edits__(col))
+
+		return self.edits
+
+	def __apply__(self, col: Collection) -> OpChanges:
+		"""
+		Writes the previewed edits, on a background thread.
+		Notes edited after the preview are skipped, their edits may be outdated.
+
+		:param col: The collection
+		:return: The changes of the operation
+		"""
+
+		# Writer for the edited notes, all in a single undo entry
+		writer = NoteWriter(col, self.undo_name, self.chunk_size)
+
+		start = time.perf_counter()
+
+		current_mods = note_mods(col, [edit.record.id for edit in self.edits])
+
+		written: List[NoteId] = list()
+
+		for edit in self.edits:
+
+			# Stop on user request, keeping the notes written so far
+			if self.progress.cancelled:
+				break
+
+			self.progress.advance()
+
+			if current_mods.get(edit.record.id) != edit.record.mod:
+				self.counts["stale"] += 1
+				continue
+
+			writer.add_edit(edit)
+			written.append(edit.record.id)
+
+		# Save the remaining notes and end undo checkpoint
+		changes = writer.finish()
+		self.timings["write"] += time.perf_counter() - start
+
+		# Previewed edits not written leave their note to process again
+		for edit in self.edits:
+			self.processed_mods.pop(edit.record.id, None)
+
+		self.__save_watermark__(col, written)
+
+		return changes
+
+	def __open_cache__(self) -> Optional[ResultCache]:
+		"""
+		Opens the persistent cache, on the thread processing the notes.
+
+		:return: The cache, ``None`` if disabled or unavailable
+		"""
+
+		if not isinstance(self, CachedOperation) or self.settings.cache_entries <= 0:
+			return None
+
+		try:
+			os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+			return ResultCache(self.cache_path, {self.cache_kind: self.cache_version()}, self.settings.cache_entries)
+		except (OSError, sqlite3.Error) as e:
+			log(f"Result cache unavailable: {e}")
+			return None
+
+	def __close_cache__(self, cache: ResultCache) -> None:
+		"""
+		Stores the pending results and closes the persistent cache.
+
+		:param cache: The cache
+		:return: ``None``
+		"""
+
+		cache.put_many(self.cache_kind, self.cache_pending)
+		self.cache_pending = list()
+		self.cached = dict()
+
+		cache.close()
+
+		log("Result cache ({kind}): {hits} hits, {misses} misses, {evictions} evictions".format(
+			kind=self.cache_kind, **cache.stats()
+		))
+
+		return
+
+	def __cache_lookup__(self, records: Iterator[NoteRecord], cache: ResultCache) -> Iterator[NoteRecord]:
+		"""
+		Looks up the cached results of the notes, a chunk at a time, keeping them until the notes are edited.
+
+		:param records: The records of the notes
+		:param cache: The cache
+		:return: An iterator over the same records
+		"""
+
+		for chunk in iter_chunks(records, self.chunk_size):
+
+			contents = [self.cache_content(record) for record in chunk]
+			lookup = [(record, content) for record, content in zip(chunk, contents) if content is not None]
+
+			values = cache.get_many(self.cache_kind, [content for _, content in lookup])
+			for (record, _), value in zip(lookup, values):
+				if value is not None:
+					self.cached[record.id] = value
+
+			yield from chunk
+
+		return
+
+	def __select_cached__(self, record: NoteRecord) -> Any:
+		"""
+		:param record: The record of a note
+		:return: The value of the note passed to the transform, with its cached value if any
+		"""
+
+		value = self.cached.get(record.id)
+		if value is not None:
+			return self.cached_select(record, value)
+
+		return self.select(record)
+
+	def __cache_result__(self, record: NoteRecord, result: Any, cache: ResultCache) -> None:
+		"""
+		Queues the result of a note to be cached, unless it was transformed with a cached value.
+
+		:param record: The record of the note
+		:param result: The result of the transform
+		:param cache: The cache
+		:return: ``None``
+		"""
+
+		if self.cached.pop(record.id, None) is not None:
+			return
+
+		content = self.cache_content(record)
+		if content is not None:
+			self.cache_pending.append((content, self.cache_value(record, result)))
+
+		if len(self.cache_pending) >= self.chunk_size:
+			cache.put_many(self.cache_kind, self.cache_pending)
+			self.cache_pending = list()
+
+		return
+
+	def __modified_note_ids__(self, col: Collection) -> Sequence[NoteId]:
+		"""
+		Filters the selected notes, skipping the ones the operation processed with its current settings
+		and that weren't modified since. Notes never processed by the operation are always kept.
+
+		:param col: The collection
+		:return: The ids of the notes to process, in the order of the selection
+		"""
+
+		store = self.__open_watermarks__()
+		if store is None:
+			return self.note_ids
+
+		try:
+			processed = store.processed(self.key, self.config_hash(), self.note_ids)
+		finally:
+			store.close()
+
+		if not processed:
+			return self.note_ids
+
+		note_ids = modified_note_ids(self.note_ids, processed, note_mods(col, processed.keys()))
+
+		self.counts["unmodified"] = len(self.note_ids) - len(note_ids)
+		self.progress.total = len(note_ids)
+
+		return note_ids
+
+	def __save_watermark__(self, col: Collection, written: List[NoteId]) -> None:
+		"""
+		Records the notes processed by the operation, in incremental mode only.
+		Written notes are recorded with their new modification time, so the next run skips them.
+
+		:param col: The collection
+		:param written: The ids of the notes written by the operation
+		:return: ``None``
+		"""
+
+		if not self.settings.incremental:
+			return
+
+		self.processed_mods.update(note_mods(col, written))
+
+		store = self.__open_watermarks__()
+		if store is None:
+			return
+
+		try:
+			store.save(self.key, self.config_hash(), self.processed_mods)
+		except sqlite3.Error as e:
+			log(f"Watermarks not saved: {e}")
+		finally:
+			store.close()
+
+		return
+
+	def __open_watermarks__(self) -> Optional[WatermarkStore]:
+		"""
+		Opens the record of the processed notes, on the thread processing the notes.
+
+		:return: The record, ``None`` if unavailable
+		"""
+
+		try:
+			os.makedirs(os.path.dirname(self.watermarks_path), exist_ok=True)
+			return WatermarkStore(self.watermarks_path)
+		except (OSError, sqlite3.Error) as e:
+			log(f"Watermarks unavailable: {e}")
+			return None
+
+	def __on_preview__(self, edits: List[NoteEdit]) -> None:
+		"""
+		Shows the previewed edits, on the main thread, then applies them if confirmed.
+
+		:param edits: The previewed edits
+		:return: ``None``
+		"""
+
+		log("{name} (preview): fetch {fetch:.2f}s, transform {transform:.2f}s".format(
+			name=self.menu_label, **self.timings
+		))
+
+		self.finished()
+
+		if ModalEditPreview(self, edits).exec():
+			self.apply()
+
+		return
+
+	def __on_success__(self, _: OpChanges) -> None:
+		"""
+		Logs the timings and shows the summary, on the main thread.
+
+		:param _: The changes of the operation
+		:return: ``None``
+		"""
+
+		log("{name}: fetch {fetch:.2f}s, transform {transform:.2f}s, write {write:.2f}s".format(
+			name=self.menu_label, **self.timings
+		))
+
+		self.finished()
+
+		showInfo(self.summary(), title=self.results_title)
+
+		return
+
+	def __timed__(self, iterator: Iterable[T], stage: str) -> Iterator[T]:
+		"""
+		Adds the time spent waiting for the items of an iterator to the timing of a stage.
+
+		:param iterator: The iterator to time
+		:param stage: The name of the stage
+		:return: An iterator over the same items
+		"""
+
+		iterator = iter(iterator)
+
+		try:
+			while True:
+				start = time.perf_counter()
+				try:
+					item = next(iterator)
+				except StopIteration:
+					return
+				finally:
+					self.timings[stage] += time.perf_counter() - start
+
+				yield item
+
+		finally:
+			# Release the stage (e.g. the worker processes) if the pipeline stops early
+			close = getattr(iterator, "close", None)
+			if close is not None:
+				close()
@@ -1,8 +1,9 @@
 from typing import TYPE_CHECKING
 
-from aqt.qt import QVBoxLayout, QCheckBox
+from aqt.qt import QVBoxLayout, QCheckBox, QFormLayout, QSpinBox
 
 from .config_dialog_module import ConfigDialogModule
+from ..qt_utils import hover_label
 
 if TYPE_CHECKING:
 	from .config_dialog import ConfigDialog
@@ -28,11 +29,41 @@ class GeneralDialogModule(ConfigDialogModule):
 		# Create layout
 		layout = QVBoxLayout(self)
 
-		# Create checkbox
+		# Create checkboxes
 		self.checkbox_show_changelog = QCheckBox("Show Changelog on Update")
+		self.checkbox_incremental = QCheckBox("Skip Notes Not Modified Since Last Processed")
+		self.checkbox_incremental.setToolTip(
+			'The colour and unpack operations skip the selected notes not modified since they last processed them,<br>'
+			'unless their settings changed in the meantime'
+		)
+
+		# 'Parallel workers' input
+		lbl_parallel_workers = hover_label(
+			'Parallel Workers',
+			'Number of processes parsing the fields of the colour and unpack operations in parallel,<br>'
+			'0 to parse them in Anki\'s process',
+		)
+		self.spin_parallel_workers = QSpinBox()
+		self.spin_parallel_workers.setRange(0, 64)
+
+		# 'Cache entries' input
+		lbl_cache_entries = hover_label(
+			'Cached Results',
+			'Maximum number of pitch graph types remembered across runs,<br>'
+			'0 to disable the cache',
+		)
+		self.spin_cache_entries = QSpinBox()
+		self.spin_cache_entries.setRange(0, 10000000)
+		self.spin_cache_entries.setSingleStep(10000)
+
+		form = QFormLayout()
+		form.addRow(lbl_parallel_workers, self.spin_parallel_workers)
+		form.addRow(lbl_cache_entries, self.spin_cache_entries)
 
 		# Add widgets to layout
 		layout.addWidget(self.checkbox_show_changelog)
+		layout.addWidget(self.checkbox_incremental)
+		layout.addLayout(form)
 		layout.addStretch(1)  # Push top
 
 		return
@@ -50,6 +81,9 @@ class GeneralDialogModule(ConfigDialogModule):
 
 		# Sync UI with settings
 		self.checkbox_show_changelog.setChecked(settings.show_changelog)
+		self.spin_parallel_workers.setValue(settings.parallel_workers)
+		self.checkbox_incremental.setChecked(settings.incremental)
+		self.spin_cache_entries.setValue(settings.cache_entries)
 
 		return
 
@@ -66,5 +100,8 @@ class GeneralDialogModule(ConfigDialogModule):
 
 		# Update settings
 		settings.show_changelog = self.checkbox_show_changelog.isChecked()
+		settings.parallel_workers = self.spin_parallel_workers.value()
+		settings.incremental = self.checkbox_incremental.isChecked()
+		settings.cache_entries = self.spin_cache_entries.value()
 
 		return True
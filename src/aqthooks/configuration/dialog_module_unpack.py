@@ -2,11 +2,13 @@ from typing import TYPE_CHECKING
 
 from aqt.qt import (
 	QVBoxLayout, QFormLayout,
-	QLabel, QLineEdit,
+	QLabel, QLineEdit, QPlainTextEdit,
 )
+from aqt.utils import showWarning
 
 from .config_dialog_module import ConfigDialogModule
 from ..qt_utils import hover_label
+from ...unpack import custom_format
 from ...utils import reloadable_script
 
 if TYPE_CHECKING:
@@ -71,10 +73,21 @@ class UnpackDialogModule(ConfigDialogModule):
 		)
 		self.input_unpack_tag_fail = QLineEdit()
 
+		# 'Custom formats' input
+		lbl_unpack_custom_formats = hover_label(
+			'Custom Formats',
+			'Regexes of additional dictionary formats, one per line,<br>'
+			'tried before the built-in ones (legacy 【】, modern (), plain).<br>'
+			'The first group must capture the reading, e.g. <code>\\[(\\w+)\\]</code>',
+		)
+		self.input_unpack_custom_formats = QPlainTextEdit()
+		self.input_unpack_custom_formats.setFixedHeight(80)
+
 		# Build form layout
 		form.addRow(lbl_unpack_dictionary_field, self.input_unpack_dictionary_field)
 		form.addRow(lbl_unpack_reading_field, self.input_unpack_reading_field)
 		form.addRow(lbl_unpack_tag_fail, self.input_unpack_tag_fail)
+		form.addRow(lbl_unpack_custom_formats, self.input_unpack_custom_formats)
 
 		# Build layout
 		layout.addWidget(lbl_unpack_subtitle)
@@ -94,7 +107,19 @@ class UnpackDialogModule(ConfigDialogModule):
 		# Get settings
 		settings = self.config_dialog.settings
 
+		# Validate custom formats
+		custom_formats = [
+			line.strip() for line in self.input_unpack_custom_formats.toPlainText().splitlines() if line.strip()
+		]
+		try:
+			for pattern in custom_formats:
+				custom_format(pattern)
+		except ValueError as e:
+			showWarning(str(e), parent=self)
+			return False
+
 		# Edit settings
+		settings.unpack.custom_formats = custom_formats
 		settings.unpack.field_dictionary = self.input_unpack_dictionary_field.text().strip()
 		settings.unpack.field_reading = self.input_unpack_reading_field.text().strip()
 		settings.unpack.tag_fail = self.input_unpack_tag_fail.text().strip()
@@ -116,5 +141,6 @@ class UnpackDialogModule(ConfigDialogModule):
 		self.input_unpack_dictionary_field.setText(settings.unpack.field_dictionary)
 		self.input_unpack_reading_field.setText(settings.unpack.field_reading)
 		self.input_unpack_tag_fail.setText(settings.unpack.tag_fail)
+		self.input_unpack_custom_formats.setPlainText('\n'.join(settings.unpack.custom_formats))
 
 		return None
@@ -0,0 +1,161 @@
+import html
+from typing import List, Optional, TYPE_CHECKING
+
+from aqt import mw
+from aqt.qt import QDialog, QHBoxLayout, QLabel, QLayout, QPushButton, QTextBrowser, QVBoxLayout
+
+from .bulk_notes import NoteEdit, note_type_names
+from ..text_diff import html_diff
+
+if TYPE_CHECKING:
+	from .bulk_operation import BulkOperation
+
+PREVIEW_PAGE_NOTES = 50
+""" Number of edited notes shown in a page of the preview """
+
+
+class ModalEditPreview(QDialog):
+	"""
+	Modal dialog showing the edits computed by a bulk operation, before writing them.
+	The edits are shown as a before/after diff of each changed field, a page at a time:
+	the diffs of a page are only built when the page is shown.
+	The dialog is accepted when the user chooses to apply the edits.
+	"""
+
+	def __init__(self, operation: 'BulkOperation', edits: List[NoteEdit]):
+
+		super().__init__(parent=operation.browser)
+		self.operation = operation
+		self.edits = edits
+		self.type_names = note_type_names(mw.col)
+		self.page = 0
+
+		self.setWindowTitle(f'Preview - {operation.menu_label}')
+		self.resize(900, 700)
+
+		# Layouts
+		self.layout: Optional[QLayout] = None
+
+		# Labels
+		self.lbl_counts: Optional[QLabel] = None
+		self.lbl_page: Optional[QLabel] = None
+
+		# Buttons
+		self.btn_prev: Optional[QPushButton] = None
+		self.btn_next: Optional[QPushButton] = None
+		self.btn_apply: Optional[QPushButton] = None
+		self.btn_close: Optional[QPushButton] = None
+
+		# Diffs of the current page
+		self.browser_diff: Optional[QTextBrowser] = None
+
+		self.setLayout(self.__layout__())
+		self.show_page(0)
+
+		return
+
+	@property
+	def page_count(self) -> int:
+		"""
+		:return: The number of pages, at least one
+		"""
+
+		return max(1, -(-len(self.edits) // PREVIEW_PAGE_NOTES))
+
+	def __layout__(self) -> QLayout:
+
+		self.layout = QVBoxLayout(self)
+
+		# Counts the operation would report
+		lines = self.operation.count_lines()
+		if self.operation.progress.cancelled:
+			lines.append(
+				f'Preview cancelled after {self.operation.progress.done} of {self.operation.progress.total} notes, '
+				'only these are applied.'
+			)
+
+		self.lbl_counts = QLabel('\n'.join(lines))
+		self.lbl_counts.setWordWrap(True)
+
+		self.browser_diff = QTextBrowser()
+
+		# Page navigation
+		self.btn_prev = QPushButton('Previous')
+		self.btn_prev.clicked.connect(lambda: self.show_page(self.page - 1))
+
+		self.lbl_page = QLabel()
+
+		self.btn_next = QPushButton('Next')
+		self.btn_next.clicked.connect(lambda: self.show_page(self.page + 1))
+
+		self.btn_apply = QPushButton(f'Apply {len(self.edits)} Changes')
+		self.btn_apply.setToolTip('Write the previewed changes, skipping the notes edited in the meantime')
+		self.btn_apply.setEnabled(bool(self.edits))
+		self.btn_apply.clicked.connect(self.accept)
+
+		self.btn_close = QPushButton('Close')
+		self.btn_close.clicked.connect(self.reject)
+
+		layout_buttons = QHBoxLayout()
+		layout_buttons.addWidget(self.btn_prev)
+		layout_buttons.addWidget(self.lbl_page)
+		layout_buttons.addWidget(self.btn_next)
+		layout_buttons.addStretch()
+		layout_buttons.addWidget(self.btn_apply)
+		layout_buttons.addWidget(self.btn_close)
+
+		self.layout.addWidget(self.lbl_counts)
+		self.layout.addWidget(self.browser_diff)
+		self.layout.addLayout(layout_buttons)
+
+		return self.layout
+
+	def show_page(self, page: int) -> None:
+		"""
+		Shows the diffs of the edits of a page.
+
+		:param page: The number of the page, from 0
+		:return: ``None``
+		"""
+
+		self.page = min(max(page, 0), self.page_count - 1)
+
+		start = self.page * PREVIEW_PAGE_NOTES
+		page_edits = self.edits[start:start + PREVIEW_PAGE_NOTES]
+
+		if page_edits:
+			self.browser_diff.setHtml(''.join(self.__edit_html__(edit) for edit in page_edits))
+		else:
+			self.browser_diff.setHtml('<p>No note would be changed.</p>')
+
+		self.lbl_page.setText(f'Page {self.page + 1} of {self.page_count}')
+		self.btn_prev.setEnabled(self.page > 0)
+		self.btn_next.setEnabled(self.page < self.page_count - 1)
+
+		return
+
+	def __edit_html__(self, edit: NoteEdit) -> str:
+		"""
+		:param edit: The edit of a note
+		:return: The diff of the edit, as a heading and a table with the old and new value of each changed field
+		"""
+
+		record = edit.record
+		type_name = self.type_names.get(record.mid, str(record.mid))
+
+		rows = list()
+		for field, value in edit.fields.items():
+			before, after = html_diff(record.fields[field], value)
+			rows.append(f'<tr><td><b>{html.escape(field)}</b></td><td>{before}</td><td>{after}</td></tr>')
+
+		if edit.tags:
+			tags = html.escape(' '.join(edit.tags))
+			rows.append(f'<tr><td><b>Tags</b></td><td></td><td>+ {tags}</td></tr>')
+
+		return (
+			f'<h4>Note {record.id} ({html.escape(type_name)})</h4>'
+			'<table border="1" cellpadding="4" cellspacing="0" width="100%">'
+			'<tr><th>Field</th><th>Before</th><th>After</th></tr>'
+			f'{"".join(rows)}'
+			'</table>'
+		)
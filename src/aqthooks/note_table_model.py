@@ -0,0 +1,142 @@
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence
+
+from anki.collection import Collection
+from anki.notes import NoteId
+from aqt.qt import QAbstractTableModel, QModelIndex, QObject, Qt
+
+from .bulk_notes import iter_note_records, note_type_names
+
+PREVIEW_PAGE_ROWS = 100
+""" Number of notes fetched from the collection when scrolling to a row that isn't loaded """
+
+PREVIEW_CACHED_PAGES = 20
+""" Maximum number of fetched pages kept in memory, the least recently used ones are dropped """
+
+PREVIEW_CELL_CHARS = 200
+""" Maximum number of characters shown in a cell, the full value is shown in its tooltip """
+
+
+class NoteTableModel(QAbstractTableModel):
+	"""
+	Read-only table of notes, with the note id and the note type in the first two columns,
+	and the given fields in the others (empty for the notes whose type lacks them).
+	Notes are fetched from the collection a page at a time, only when one of their rows is drawn,
+	so the cost of showing a large selection only depends on the rows scrolled into view.
+	"""
+
+	def __init__(
+			self,
+			col: Collection,
+			note_ids: Sequence[NoteId],
+			id_column: str,
+			type_column: str,
+			columns: List[str],
+			parent: Optional[QObject] = None,
+	):
+		"""
+		Initializes the model, without fetching any note.
+
+		:param col: The collection to read the notes from
+		:param note_ids: The ids of the notes, one per row
+		:param id_column: The header of the note id column
+		:param type_column: The header of the note type column
+		:param columns: The names of the fields, one per column after the note type
+		:param parent: The parent of the model
+		"""
+
+		super().__init__(parent)
+
+		self.col = col
+		self.note_ids = note_ids
+		self.headers = [id_column, type_column] + columns
+		self.columns = columns
+		self.type_names = note_type_names(col)
+
+		# Fetched rows, by page number
+		self.pages: OrderedDict[int, List[List[Any]]] = OrderedDict()
+
+		return
+
+	def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+
+		return 0 if parent.isValid() else len(self.note_ids)
+
+	def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+
+		return 0 if parent.isValid() else len(self.headers)
+
+	def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+
+		if not index.isValid():
+			return None
+
+		if role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+			return None
+
+		value = str(self.__row__(index.row())[index.column()])
+
+		if role == Qt.ItemDataRole.DisplayRole and len(value) > PREVIEW_CELL_CHARS:
+			return value[:PREVIEW_CELL_CHARS] + '…'
+
+		return value
+
+	def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+
+		if role != Qt.ItemDataRole.DisplayRole:
+			return None
+
+		if orientation == Qt.Orientation.Horizontal:
+			return self.headers[section]
+
+		return section + 1
+
+	def __row__(self, row: int) -> List[Any]:
+		"""
+		Returns the values of a row, fetching its page if it isn't loaded.
+
+		:param row: The number of the row
+		:return: The note id and the note type name, followed by the field values
+		"""
+
+		page_number = row // PREVIEW_PAGE_ROWS
+
+		page = self.pages.get(page_number)
+		if page is None:
+			page = self.__fetch_page__(page_number)
+
+			# Drop the least recently used page
+			self.pages[page_number] = page
+			if len(self.pages) > PREVIEW_CACHED_PAGES:
+				self.pages.popitem(last=False)
+		else:
+			self.pages.move_to_end(page_number)
+
+		return page[row % PREVIEW_PAGE_ROWS]
+
+	def __fetch_page__(self, page_number: int) -> List[List[Any]]:
+		"""
+		Fetches the rows of a page, with a single query.
+		Notes deleted after the model was created are shown with empty fields.
+
+		:param page_number: The number of the page
+		:return: The rows of the page
+		"""
+
+		start = page_number * PREVIEW_PAGE_ROWS
+		page_ids = self.note_ids[start:start + PREVIEW_PAGE_ROWS]
+
+		records = iter_note_records(self.col, page_ids, fields=self.columns)
+		records = {record.id: record for record in records}
+
+		rows = list()
+		for note_id in page_ids:
+			record = records.get(note_id)
+			if record is None:
+				rows.append([note_id, ''] + [''] * len(self.columns))
+				continue
+
+			type_name = self.type_names.get(record.mid, str(record.mid))
+			rows.append([note_id, type_name] + [record.fields.get(field, '') for field in self.columns])
+
+		return rows
@@ -0,0 +1,126 @@
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from .table_io import iter_chunks
+
+PARALLEL_CHUNK_SIZE = 500
+""" Number of items sent to a worker process at once """
+
+PARALLEL_CHUNKS_PER_WORKER = 2
+""" Number of chunks queued for each worker, bounding the items held in memory """
+
+T = TypeVar('T')
+A = TypeVar('A')
+R = TypeVar('R')
+
+
+def map_batches(
+		func: Callable[[List[A]], List[R]],
+		items: Iterable[T],
+		select: Callable[[T], A],
+		workers: int = 0,
+		chunk_size: int = PARALLEL_CHUNK_SIZE,
+) -> Iterator[Tuple[T, R]]:
+	"""
+	Transforms the items a chunk at a time, streaming each item back with its result, in the same order.
+	Only the selected part of each item is passed to the transform, so that items can stay in this process.
+
+	With workers, the chunks are transformed in a pool of spawned processes while the next ones are read:
+	the transform must then be picklable (a top-level function, or a ``functools.partial`` of one),
+	as well as its arguments and results, and its module must be importable without aqt.
+	If the pool can't be used, the remaining chunks are transformed here.
+
+	:param func: The transform, from the arguments of a chunk to their results
+	:param items: The items to transform
+	:param select: Extracts the argument of the transform from an item
+	:param workers: The number of worker processes, ``0`` to transform everything in this process
+	:param chunk_size: The number of items transformed at once
+	:return: An iterator over the items and their results
+	"""
+
+	chunks = iter_chunks(items, chunk_size)
+
+	if workers > 0:
+		chunks = yield from __map_parallel__(func, chunks, select, workers)
+
+	for chunk in chunks:
+		yield from zip(chunk, func([select(item) for item in chunk]))
+
+	return
+
+
+def __map_parallel__(
+		func: Callable[[List[A]], List[R]],
+		chunks: Iterator[List[T]],
+		select: Callable[[T], A],
+		workers: int,
+) -> Iterator[Tuple[T, R]]:
+	"""
+	Transforms the chunks in a pool of processes, see ``map_batches``.
+	If the pool breaks, stops and returns the chunks left to transform.
+
+	:param func: The transform, from the arguments of a chunk to their results
+	:param chunks: The chunks of items to transform
+	:param select: Extracts the argument of the transform from an item
+	:param workers: The number of worker processes
+	:return: An iterator over the items and their results, returning the chunks left to transform
+	"""
+
+	# Chunks sent to the pool, with their results
+	pending: Deque[Tuple[List[T], Future]] = deque()
+	failed: Optional[Exception] = None
+
+	# Chunk read but not sent to the pool yet
+	unsent: List[List[T]] = list()
+
+	try:
+		# Forking the multi-threaded Anki process from a background thread could deadlock the workers
+		executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+	except (OSError, ValueError, NotImplementedError):
+		return chunks
+
+	try:
+
+		for chunk in chunks:
+			unsent = [chunk]
+			pending.append((chunk, executor.submit(func, [select(item) for item in chunk])))
+			unsent = list()
+
+			# Wait for the oldest chunk before reading more
+			if len(pending) >= workers * PARALLEL_CHUNKS_PER_WORKER:
+				chunk, future = pending[0]
+				yield from zip(chunk, future.result())
+				pending.popleft()
+
+		while pending:
+			chunk, future = pending[0]
+			yield from zip(chunk, future.result())
+			pending.popleft()
+
+	except Exception as e:
+		# Broken pool or transform that can't be pickled, a genuine error is raised again serially
+		failed = e
+
+	finally:
+		for _, future in pending:
+			future.cancel()
+		executor.shutdown(wait=failed is None)
+
+	if failed is None:
+		return iter(())
+
+	# Chunks not yielded yet, then the ones not read yet
+	return __chain_chunks__([chunk for chunk, _ in pending] + unsent, chunks)
+
+
+def __chain_chunks__(first: List[List[T]], rest: Iterator[List[T]]) -> Iterator[List[T]]:
+	"""
+	:param first: The chunks to iterate first
+	:param rest: The chunks to iterate next
+	:return: An iterator over both
+	"""
+
+	yield from first
+	yield from rest
@@ -1,26 +1,31 @@
 import re
-from enum import Enum
-from typing import Optional
-from xml.etree import ElementTree
-from xml.etree.ElementTree import Element
-
-re_pitch_section = re.compile(r'<!-- (?:user_)?accent_start -->(.*?)<!-- (?:user_)?accent_end -->')
+from array import array
+from collections import OrderedDict
+from enum import Enum, IntEnum
+from typing import Optional, List, Tuple, Iterable, Dict, NamedTuple
+
+re_pitch_section = re.compile(
+	r'<!-- (?:user_)?accent_start -->'
+	r'([^<\n]*(?:<(?!!-- (?:user_)?accent_end -->)[^<\n]*)*)'
+	r'<!-- (?:user_)?accent_end -->'
+)
 """ Regex for extracting the pitch graph section """
 
-re_tags_pitch_svg = re.compile(r'</?(?:svg|circle).*?>')
-""" Regex to find all svg/circle tags """
-
-re_tag_start_font_color = re.compile(r'^<font color=".*?">(.*)$')
-""" Regex to find font tag with colour """
+re_svg_graph_node = re.compile(r'<circle(?=[^>]*?\scx="([^"]*)")(?=[^>]*?\scy="([^"]*)")')
+""" Regex to find the (cx, cy) coordinates of the circles in the svg graph, in any attribute order """
 
-re_svg_graph_text = re.compile(r'<text(.*?)fill:.*?;(.*?)>')
-""" Regex to find text in the svg graph """
+re_tag_start_font_color = re.compile(r'<font color=".*?">(.*)$')
+""" Regex to find font tag with colour (match it with ``pos``/``endpos`` to anchor it on a text part) """
 
-re_svg_graph_path = re.compile(r'<path(.*?)stroke:.*?;(.*?)>')
-""" Regex to find paths in the svg graph """
+re_svg_graph_tag = re.compile(r'<(text|path|circle r="5")[^>]*>')
+""" Regex to tokenize the svg graph tags to colour: texts, paths and circles (rad. 5) """
 
-re_svg_graph_circle = re.compile(r'<circle r="5"(.*?)fill:.*?;(.*?)>')
-""" Regex to find circles (rad. 5) in the svg graph """
+SVG_GRAPH_COLOUR_PROPS = {
+	'text': 'fill:',
+	'path': 'stroke:',
+	'circle r="5"': 'fill:',
+}
+""" Style property holding the colour of each svg graph tag """
 
 
 class PitchTypes(Enum):
@@ -30,24 +35,143 @@ class PitchTypes(Enum):
 	OODAKA = "oodaka"
 
 
-def infer_pitch_type_from_graph(svg_root: Element) -> Optional[PitchTypes]:
+class PitchFailReasons(IntEnum):
+	"""
+	Reasons for a pitch classification failure, stored as codes in ``PitchBatchResult.reasons``.
+	"""
+	NONE = 0
+	NO_SECTION = 1
+	TOO_FEW_NODES = 2
+	MALFORMED = 3
+
+
+PITCH_TYPE_CODES: Tuple[PitchTypes, ...] = tuple(PitchTypes)
+""" Pitch types indexed by their code in ``PitchBatchResult.codes`` """
+
+PITCH_CODE_NONE = -1
+""" Code of an unclassified field in ``PitchBatchResult.codes`` """
+
+PITCH_PARSER_VERSION = "1"
+""" Version of the pitch graph parsing, to increase when its results change (invalidates the persistent cache) """
+
+
+class PitchTypeCache:
+	"""
+	Bounded LRU cache mapping a normalized graph signature to its pitch type.
+	The hit/miss/eviction counters can be inspected to measure its effectiveness during a bulk run.
+	"""
+
+	def __init__(self, maxsize: int = 1024):
+		"""
+		Initializes an empty cache.
+
+		:param maxsize: maximum number of signatures to keep
+		"""
+
+		self.maxsize = maxsize
+		self.entries: 'OrderedDict[Tuple[bool, ...], PitchTypes]' = OrderedDict()
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+		return
+
+	def get(self, signature: Tuple[bool, ...]) -> Optional[PitchTypes]:
+		"""
+		Looks up a signature, marking it as the most recently used.
+
+		:param signature: normalized graph signature
+		:return: cached pitch type or None if not cached
+		"""
+
+		pitch_type = self.entries.get(signature)
+
+		if pitch_type is None:
+			self.misses += 1
+			return None
+
+		self.hits += 1
+		self.entries.move_to_end(signature)
+
+		return pitch_type
+
+	def put(self, signature: Tuple[bool, ...], pitch_type: PitchTypes) -> None:
+		"""
+		Stores the pitch type of a signature, evicting the least recently used signature if full.
+
+		:param signature: normalized graph signature
+		:param pitch_type: pitch type of the signature
+		:return: ``None``
+		"""
+
+		self.entries[signature] = pitch_type
+		self.entries.move_to_end(signature)
+
+		while len(self.entries) > self.maxsize:
+			self.entries.popitem(last=False)
+			self.evictions += 1
+
+		return
+
+	def clear(self) -> None:
+		"""
+		Removes all the signatures and resets the counters.
+
+		:return: ``None``
+		"""
+
+		self.entries.clear()
+		self.reset_stats()
+
+		return
+
+	def reset_stats(self) -> None:
+		"""
+		Resets the hit/miss/eviction counters, keeping the cached signatures.
+
+		:return: ``None``
+		"""
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+		return
+
+	def stats(self) -> Dict[str, int]:
+		"""
+		:return: the counters of the cache and its current size
+		"""
+
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"size": len(self.entries),
+		}
+
+
+pitch_type_cache = PitchTypeCache()
+""" Cache shared by every call of ``infer_pitch_type_from_graph`` """
+
+
+def infer_pitch_type_from_graph(nodes: Iterable[Tuple[int, int]]) -> Optional[PitchTypes]:
 	"""
-	Infer the pitch type from the accent svg root.
+	Infer the pitch type from the nodes of the accent svg.
+	Graphs are classified by their signature (the ordered high/low levels of the nodes),
+	which is looked up in ``pitch_type_cache`` first.
 
-	:param svg_root: root of the accent svg
+	:param nodes: (cx, cy) coordinates of the graph nodes, as returned by ``find_pitch_graph_nodes``
 	:return: pitch type or None if not found
 	"""
 
 	# Get all y values on distinct x values
 	# (assuming if x values overlap then y values are the same)
-	nodes = {
-		int(node.attrib["cx"]): int(node.attrib["cy"])
-		for node
-		in svg_root
-	}
+	nodes = dict(nodes)
 
 	# Order on x values and get y values
-	y_values = list(map(lambda t: t[1], sorted(nodes.items())))
+	y_values = [nodes[x] for x in sorted(nodes)]
 
 	if len(y_values) < 2:
 		return None
@@ -55,45 +179,148 @@ def infer_pitch_type_from_graph(svg_root: Element) -> Optional[PitchTypes]:
 	# Get highest y value (svg axis is inverted, from top to bottom)
 	y_high = min(y_values)
 
+	# Normalize the graph into its signature
+	signature = tuple(y == y_high for y in y_values)
+
+	pitch_type = pitch_type_cache.get(signature)
+	if pitch_type is None:
+		pitch_type = classify_graph_signature(signature)
+		pitch_type_cache.put(signature, pitch_type)
+
+	return pitch_type
+
+
+def classify_graph_signature(signature: Tuple[bool, ...]) -> PitchTypes:
+	"""
+	Classify a graph signature into its pitch type.
+
+	:param signature: whether each node (ordered on x values) is high, at least two nodes
+	:return: pitch type
+	"""
+
 	# First node high: atamadaka
-	if y_values[0] == y_high:
+	if signature[0]:
 		return PitchTypes.ATAMADAKA
 
 	# First node low, other nodes high: heiban
-	if all(map(lambda y: y == y_high, y_values[1:])):
+	if all(signature[1:]):
 		return PitchTypes.HEIBAN
 
 	# First node low, other nodes high except last: oodaka
-	if all(map(lambda y: y == y_high, y_values[1:-1])):
+	if all(signature[1:-1]):
 		return PitchTypes.OODAKA
 
 	# Other cases: nakadaka
 	return PitchTypes.NAKADAKA
 
 
-def find_pitch_graph_xml(field_content: str) -> Optional[Element]:
+def find_pitch_graph_nodes(field_content: str) -> Optional[List[Tuple[int, int]]]:
 	"""
-	Find the root of the accent svg in the field content.
+	Find the (cx, cy) coordinates of the nodes of the accent svg in the field content.
+	The coordinates are read straight from the accent section, in document order.
 
 	:param field_content: string containing the field content
-	:return: root of the accent svg or None if not found
+	:return: list of node coordinates or None if there is no accent section
+	:raises ValueError: if a node has non-integer coordinates
 	"""
 	match = re_pitch_section.search(field_content)
 	if not match:
 		return None
 
-	# Find all tags returned in a list, then join them
-	accent_tags = re_tags_pitch_svg.findall(match.group(1))
-	accent_tags = "".join(accent_tags)
+	return [
+		(int(node.group(1)), int(node.group(2)))
+		for node
+		in re_svg_graph_node.finditer(field_content, match.start(1), match.end(1))
+	]
+
+
+class PitchBatchResult(NamedTuple):
+	"""
+	Compact result of ``classify_pitch_batch``: two parallel arrays with one byte per field.
+	"""
+
+	codes: array
+	""" Index of the pitch type in ``PITCH_TYPE_CODES``, or ``PITCH_CODE_NONE`` if unclassified """
+
+	reasons: array
+	""" ``PitchFailReasons`` value of each field """
+
+	def pitch_type(self, i: int) -> Optional[PitchTypes]:
+		"""
+		:param i: index of the field in the batch
+		:return: pitch type of the field or None if unclassified
+		"""
 
-	# Return the accent tags as an Element
-	return ElementTree.fromstring(accent_tags)
+		code = self.codes[i]
+
+		return PITCH_TYPE_CODES[code] if code != PITCH_CODE_NONE else None
+
+	def counts(self) -> Dict[str, int]:
+		"""
+		:return: the number of fields for each pitch type and failure reason
+		"""
+
+		counts = {pitch_type.value: 0 for pitch_type in PitchTypes}
+		counts.update({reason.name.lower(): 0 for reason in PitchFailReasons if reason != PitchFailReasons.NONE})
+
+		for code, reason in zip(self.codes, self.reasons):
+			if code != PITCH_CODE_NONE:
+				counts[PITCH_TYPE_CODES[code].value] += 1
+			else:
+				counts[PitchFailReasons(reason).name.lower()] += 1
+
+		return counts
+
+
+def classify_pitch_field(field_content: str) -> Tuple[int, PitchFailReasons]:
+	"""
+	Classify the pitch type of a single field.
+
+	:param field_content: string containing the field content
+	:return: the pitch type code (see ``PITCH_TYPE_CODES``) and the failure reason
+	"""
+
+	try:
+		nodes = find_pitch_graph_nodes(field_content)
+	except ValueError:
+		return PITCH_CODE_NONE, PitchFailReasons.MALFORMED
+
+	if nodes is None:
+		return PITCH_CODE_NONE, PitchFailReasons.NO_SECTION
+
+	pitch_type = infer_pitch_type_from_graph(nodes)
+	if pitch_type is None:
+		return PITCH_CODE_NONE, PitchFailReasons.TOO_FEW_NODES
+
+	return PITCH_TYPE_CODES.index(pitch_type), PitchFailReasons.NONE
+
+
+def classify_pitch_batch(fields: Iterable[str]) -> PitchBatchResult:
+	"""
+	Classify the pitch type of many fields at once.
+	The result holds one byte per field for the pitch type and one for the failure reason,
+	instead of an object (and possibly an exception) per field.
+
+	:param fields: contents of the fields containing the pitch graphs
+	:return: the pitch type codes and the failure reasons, in the same order as the fields
+	"""
+
+	codes = array('b')
+	reasons = array('b')
+
+	for field_content in fields:
+		code, reason = classify_pitch_field(field_content)
+		codes.append(code)
+		reasons.append(reason)
+
+	return PitchBatchResult(codes, reasons)
 
 
 def apply_colour_to_field(text: str, colour: str, colour_graph: bool = False) -> str:
 	"""
 	Apply a colour to the text and optionally to the pitch graph.
 	This function assumes there is at most one pitch graph in the text.
+	The field is scanned once and the coloured field is emitted in a single linear pass.
 
 	:param text: text to colour
 	:param colour: colour to apply
@@ -101,51 +328,148 @@ def apply_colour_to_field(text: str, colour: str, colour_graph: bool = False) ->
 	:return: coloured text
 	"""
 
-	# Split text by pitch graph
+	out = []
+
+	# Find pitch graph boundaries
 	match_pitch = re_pitch_section.search(text)
 	if match_pitch:
-		pitch_section = match_pitch.group(0)
-		texts = text.split(pitch_section)
+		pitch_start, pitch_end = match_pitch.span()
 	else:
-		pitch_section = ''
-		texts = [text]
+		pitch_start, pitch_end = len(text), len(text)
 
-	# Apply colour to each part of the text
-	for i, subtext in enumerate(texts):
+	# Text before the pitch graph
+	__emit_coloured_text__(out, text, 0, pitch_start, colour)
 
-		# Skip empty subtexts
-		if not subtext:
-			continue
+	# Pitch graph
+	if colour_graph:
+		__emit_coloured_graph__(out, text, pitch_start, pitch_end, colour)
+	else:
+		out.append(text[pitch_start:pitch_end])
+
+	# Text after the pitch graph
+	__emit_coloured_text__(out, text, pitch_end, len(text), colour)
+
+	return ''.join(out)
+
+
+def colour_fields_from_pitch(
+		reading: str,
+		fields: Dict[str, str],
+		colours: Dict[PitchTypes, str],
+		colour_graph: bool = False,
+		pitch_code: Optional[int] = None,
+) -> Tuple[int, Dict[str, str]]:
+	"""
+	Classify the pitch type of the reading, and colour the fields with the colour of the pitch type.
+
+	:param reading: content of the field containing the pitch graph
+	:param fields: contents of the fields to colour, by name
+	:param colours: colour of each pitch type
+	:param colour_graph: whether to apply the colour to the pitch graphs
+	:param pitch_code: pitch type code of the reading if already known, to skip its classification
+	:return: the pitch type code (see ``PITCH_TYPE_CODES``) and the coloured fields (only the non-empty ones),
+		no fields if the pitch type can't be found
+	"""
+
+	if pitch_code is None:
+		pitch_code, _ = classify_pitch_field(reading)
+
+	if pitch_code == PITCH_CODE_NONE:
+		return pitch_code, dict()
+
+	colour = colours[PITCH_TYPE_CODES[pitch_code]]
+
+	return pitch_code, {
+		field: apply_colour_to_field(text, colour, colour_graph=colour_graph)
+		for field, text in fields.items()
+		if text
+	}
+
+
+def colour_fields_batch(
+		colours: Dict[PitchTypes, str],
+		colour_graph: bool,
+		notes: List[Tuple[str, Dict[str, str], Optional[int]]],
+) -> List[Tuple[int, Dict[str, str]]]:
+	"""
+	Apply ``colour_fields_from_pitch`` to many notes at once.
+	Being a top-level function, it can be sent to worker processes (bind the colours with ``functools.partial``).
+
+	:param colours: colour of each pitch type
+	:param colour_graph: whether to apply the colour to the pitch graphs
+	:param notes: the reading field, the fields to colour and the pitch type code if already known of each note
+	:return: the result of each note, in the same order
+	"""
+
+	return [
+		colour_fields_from_pitch(reading, fields, colours, colour_graph, pitch_code=pitch_code)
+		for reading, fields, pitch_code in notes
+	]
+
+
+def __emit_coloured_text__(out: List[str], text: str, start: int, end: int, colour: str) -> None:
+	"""
+	Append to ``out`` the coloured version of ``text[start:end]``.
+	If the part starts with a font colour tag, its colour is replaced; otherwise, the part is wrapped in a font tag.
+
+	:param out: list of output chunks
+	:param text: whole field text
+	:param start: start of the part to colour
+	:param end: end of the part to colour
+	:param colour: colour to apply
+	:return: ``None``
+	"""
 
-		# Find color tag in subtext
-		match_font = re_tag_start_font_color.match(subtext)
+	# Skip empty parts
+	if start >= end:
+		return
 
-		if match_font:
-			# Replace color in tag
-			subtext = f'<font color="{colour}">{match_font.group(1)}'
-		else:
-			# Wrap text in color
-			subtext = f'<font color="{colour}">{subtext}</font>'
+	match_font = re_tag_start_font_color.match(text, start, end)
 
-		texts[i] = subtext
+	if match_font:
+		# Replace color in tag
+		out.append(f'<font color="{colour}">')
+		out.append(text[match_font.start(1):match_font.end(1)])
+	else:
+		# Wrap text in color
+		out.append(f'<font color="{colour}">')
+		out.append(text[start:end])
+		out.append('</font>')
+
+	return
 
-	# Colour the pitch graph
-	if pitch_section and colour_graph:
-		def repl_colour_text(match: re.Match):
-			""" Replace all colours in svg text tags """
-			return f'<text{match.group(1)}fill:{colour} !important;{match.group(2)}>'
 
-		def repl_colour_path(match: re.Match):
-			""" Replace all colours in svg path tags """
-			return f'<path{match.group(1)}stroke:{colour} !important;{match.group(2)}>'
+def __emit_coloured_graph__(out: List[str], text: str, start: int, end: int, colour: str) -> None:
+	"""
+	Append to ``out`` the pitch graph ``text[start:end]`` with the colour applied
+	to its texts, paths and circles (rad. 5).
+
+	:param out: list of output chunks
+	:param text: whole field text
+	:param start: start of the pitch graph section
+	:param end: end of the pitch graph section
+	:param colour: colour to apply
+	:return: ``None``
+	"""
+
+	pos = start
+	for match in re_svg_graph_tag.finditer(text, start, end):
+		prop = SVG_GRAPH_COLOUR_PROPS[match.group(1)]
+
+		# Find the colour value within the tag
+		prop_start = text.find(prop, match.start(), match.end())
+		if prop_start < 0:
+			continue
+
+		prop_end = text.find(';', prop_start, match.end())
+		if prop_end < 0:
+			continue
 
-		def repl_colour_circle(match: re.Match):
-			""" Replace all colours in svg circle tags (with rad. 5) """
-			return f'<circle r="5"{match.group(1)}fill:{colour} !important;{match.group(2)}>'
+		# Replace the colour value, keep everything else
+		out.append(text[pos:prop_start])
+		out.append(f'{prop}{colour} !important')
+		pos = prop_end
 
-		pitch_section = re_svg_graph_text.sub(repl_colour_text, pitch_section)
-		pitch_section = re_svg_graph_path.sub(repl_colour_path, pitch_section)
-		pitch_section = re_svg_graph_circle.sub(repl_colour_circle, pitch_section)
+	out.append(text[pos:end])
 
-	# Join the text parts and the pitch section
-	return texts[0] + pitch_section + (''.join(texts[1:]) if len(texts) > 1 else '')
+	return
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CACHE_SCHEMA_VERSION = "1"
+""" Version of the tables of the cache file, older files are emptied """
+
+CACHE_MAX_ENTRIES = 100000
+""" Default maximum number of results kept, the least recently used ones are evicted """
+
+CACHE_QUERY_KEYS = 500
+""" Number of hashes looked up in a single query """
+
+
+def content_hash(content: str) -> bytes:
+	"""
+	:param content: The content of a field
+	:return: The 16-byte hash of the content
+	"""
+
+	return hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+
+
+class ResultCache:
+	"""
+	Persistent cache of parsing results, stored in a SQLite file.
+	Results are grouped by kind (e.g. the pitch type of a graph)
+	and keyed by a hash of the parsed content. Each kind has a version: when it changes (e.g. the parser
+	was updated), the results of that kind are discarded. When the cache is closed, the least recently used
+	results are evicted to keep it within its size.
+	"""
+
+	def __init__(self, path: str, versions: Dict[str, str], max_entries: int = CACHE_MAX_ENTRIES):
+		"""
+		Opens the cache file, creating it if missing, and discards the results of outdated versions.
+
+		:param path: The path of the cache file
+		:param versions: The current version of each kind of result
+		:param max_entries: The maximum number of results kept
+		:raises sqlite3.Error: If the file can't be opened
+		"""
+
+		self.max_entries = max_entries
+		self.now = int(time.time())
+
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+		self.conn = sqlite3.connect(path)
+		self.__setup__(versions)
+
+		return
+
+	def __setup__(self, versions: Dict[str, str]) -> None:
+		"""
+		Creates the tables and checks the versions of the cached results.
+
+		:param versions: The current version of each kind of result
+		:return: ``None``
+		"""
+
+		self.conn.execute("create table if not exists meta (key text primary key, value text not null)")
+
+		if self.__meta__("schema") != CACHE_SCHEMA_VERSION:
+			self.conn.execute("drop table if exists results")
+			self.__set_meta__("schema", CACHE_SCHEMA_VERSION)
+
+		self.conn.execute(
+			"create table if not exists results ("
+			"kind text not null, hash blob not null, value text not null, last_used integer not null, "
+			"primary key (kind, hash)) without rowid"
+		)
+		self.conn.execute("create index if not exists results_last_used on results (last_used)")
+
+		for kind, version in versions.items():
+			key = f"version:{kind}"
+			if self.__meta__(key) != version:
+				self.conn.execute("delete from results where kind = ?", (kind,))
+				self.__set_meta__(key, version)
+
+		self.conn.commit()
+
+		return
+
+	def __meta__(self, key: str) -> Optional[str]:
+		"""
+		:param key: The key of the metadata
+		:return: The value of the metadata, ``None`` if missing
+		"""
+
+		row = self.conn.execute("select value from meta where key = ?", (key,)).fetchone()
+
+		return row[0] if row else None
+
+	def __set_meta__(self, key: str, value: str) -> None:
+		"""
+		:param key: The key of the metadata
+		:param value: The value of the metadata
+		:return: ``None``
+		"""
+
+		self.conn.execute("insert or replace into meta (key, value) values (?, ?)", (key, value))
+
+		return
+
+	def get_many(self, kind: str, contents: Sequence[str]) -> List[Optional[Any]]:
+		"""
+		Looks up the results of many contents, marking the found ones as recently used.
+
+		:param kind: The kind of the results
+		:param contents: The parsed contents
+		:return: The result of each content, ``None`` if not cached
+		"""
+
+		hashes = [content_hash(content) for content in contents]
+		unique = list(dict.fromkeys(hashes))
+
+		found: Dict[bytes, str] = dict()
+		for i in range(0, len(unique), CACHE_QUERY_KEYS):
+			chunk = unique[i:i + CACHE_QUERY_KEYS]
+			placeholders = ', '.join('?' * len(chunk))
+			rows = self.conn.execute(
+				f"select hash, value from results where kind = ? and hash in ({placeholders})", (kind, *chunk)
+			)
+			found.update(rows)
+
+		if found:
+			self.conn.executemany(
+				"update results set last_used = ? where kind = ? and hash = ?",
+				[(self.now, kind, hash_) for hash_ in found],
+			)
+
+		values = [json.loads(found[hash_]) if hash_ in found else None for hash_ in hashes]
+
+		self.misses += values.count(None)
+		self.hits += len(values) - values.count(None)
+
+		return values
+
+	def put_many(self, kind: str, results: Iterable[Tuple[str, Any]]) -> None:
+		"""
+		Stores the results of many contents.
+
+		:param kind: The kind of the results
+		:param results: The parsed contents and their results, serializable to json
+		:return: ``None``
+		"""
+
+		self.conn.executemany(
+			"insert or replace into results (kind, hash, value, last_used) values (?, ?, ?, ?)",
+			[(kind, content_hash(content), json.dumps(value), self.now) for content, value in results],
+		)
+
+		return
+
+	def evict(self) -> None:
+		"""
+		Removes the least recently used results exceeding the size of the cache.
+
+		:return: ``None``
+		"""
+
+		count = self.conn.execute("select count() from results").fetchone()[0]
+		excess = count - self.max_entries
+
+		if excess > 0:
+			self.conn.execute(
+				"delete from results where (kind, hash) in "
+				"(select kind, hash from results order by last_used limit ?)",
+				(excess,),
+			)
+			self.evictions += excess
+
+		return
+
+	def close(self) -> None:
+		"""
+		Evicts the exceeding results, saves the changes and closes the file.
+
+		:return: ``None``
+		"""
+
+		self.evict()
+		self.conn.commit()
+		self.conn.close()
+
+		return
+
+	def stats(self) -> Dict[str, int]:
+		"""
+		:return: The counters of the cache
+		"""
+
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+		}
@@ -24,6 +24,9 @@ class AddonSettings:
 		# Init root variables
 		self.version = lookup_field(conf, "version", "")
 		self.show_changelog = lookup_field(conf, "show_changelog", True)
+		self.parallel_workers = lookup_field(conf, "parallel_workers", 0)
+		self.incremental = lookup_field(conf, "incremental", False)
+		self.cache_entries = lookup_field(conf, "cache_entries", 0)
 
 		# Init UnpackConfig
 		unpack_conf = lookup_field(conf, "unpack")
@@ -39,10 +42,14 @@ class AddonSettings:
 		return {
 			"version": self.version,
 			"show_changelog": self.show_changelog,
+			"parallel_workers": self.parallel_workers,
+			"incremental": self.incremental,
+			"cache_entries": self.cache_entries,
 			"unpack": {
 				"field_dictionary": self.unpack.field_dictionary,
 				"field_reading": self.unpack.field_reading,
 				"tag_fail": self.unpack.tag_fail,
+				"custom_formats": self.unpack.custom_formats,
 			},
 			"pitch": {
 				"field_reading": self.pitch.field_reading,
@@ -74,6 +81,8 @@ class UnpackSettings:
 
 		self.tag_fail = lookup_field(conf, "tag_fail", "bulkops::failed-unpack")
 
+		self.custom_formats = lookup_field(conf, "custom_formats", [])
+
 		return
 
 
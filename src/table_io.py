@@ -0,0 +1,340 @@
+import csv
+import gzip
+import json
+import re
+from typing import Any, Callable, Dict, Iterable, Sequence, TextIO, Iterator, List, NamedTuple, Optional, Tuple, TypeVar
+
+WRITE_CHUNK_ROWS = 500
+""" Number of rows buffered before being written to the stream """
+
+READ_CHUNK_ROWS = 500
+""" Number of rows read from the stream before being processed """
+
+T = TypeVar('T')
+
+re_tsv_escape = re.compile(r'\\(.)')
+""" Escape sequence in a TSV value """
+
+TSV_ESCAPES = {'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'}
+TSV_UNESCAPES = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r'}
+
+
+class TableFormatError(ValueError):
+	"""
+	Raised while reading a malformed row, that can't be split into values.
+	"""
+
+	def __init__(self, line_number: int, reason: str):
+		super().__init__(f"Line {line_number}: {reason}")
+		self.line_number = line_number
+		self.reason = reason
+
+
+def open_table_file(path: str, mode: str = 'r') -> TextIO:
+	"""
+	Opens a table file in text mode, ready to be used by the ``csv`` module.
+	Paths ending with ``.gz`` are transparently (de)compressed with gzip.
+
+	:param path: The path of the file
+	:param mode: ``'r'`` to read, ``'w'`` to write
+	:return: The text stream of the file
+	"""
+
+	if path.lower().endswith('.gz'):
+		# noinspection PyTypeChecker
+		return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+
+	return open(path, mode, encoding='utf-8', newline='')
+
+
+def write_csv_rows(
+		stream: TextIO,
+		header: Sequence[str],
+		rows: Iterable[Sequence],
+		chunk_rows: int = WRITE_CHUNK_ROWS,
+) -> int:
+	"""
+	Writes a csv (header included) to a stream, consuming the rows lazily and writing them in chunks,
+	so that only a chunk of rows is held in memory at any time.
+
+	:param stream: The stream to write to
+	:param header: The header of the csv
+	:param rows: The rows of the csv, without the header
+	:param chunk_rows: The number of rows written at once
+	:return: The number of rows written, without the header
+	"""
+
+	writer = csv.writer(stream)
+	writer.writerow(header)
+
+	count = 0
+	chunk = list()
+
+	for row in rows:
+		chunk.append(row)
+
+		if len(chunk) >= chunk_rows:
+			writer.writerows(chunk)
+			count += len(chunk)
+			chunk = list()
+
+	writer.writerows(chunk)
+	count += len(chunk)
+
+	return count
+
+
+def read_csv_rows(stream: TextIO) -> Tuple[Optional[List[str]], Iterator[Tuple[int, List[str]]]]:
+	"""
+	Reads the header of a csv from a stream, leaving the rows to be read lazily.
+
+	:param stream: The stream to read from
+	:return: The header (None if the csv is empty) and an iterator over the remaining rows,
+		with the number of the line each row starts at (quoted values can span several lines)
+	"""
+
+	reader = csv.reader(stream)
+	header = next(reader, None)
+
+	def rows() -> Iterator[Tuple[int, List[str]]]:
+
+		line_number = reader.line_num + 1
+		for row in reader:
+			yield line_number, row
+			line_number = reader.line_num + 1
+
+	return header, rows()
+
+
+def iter_chunks(items: Iterable[T], chunk_size: int) -> Iterator[List[T]]:
+	"""
+	Groups the items of an iterable into lists, consuming it lazily.
+
+	:param items: The items to group
+	:param chunk_size: The maximum size of each list
+	:return: An iterator over the lists
+	"""
+
+	chunk = list()
+
+	for item in items:
+		chunk.append(item)
+
+		if len(chunk) >= chunk_size:
+			yield chunk
+			chunk = list()
+
+	if chunk:
+		yield chunk
+
+	return
+
+
+def write_tsv_rows(
+		stream: TextIO,
+		header: Sequence[str],
+		rows: Iterable[Sequence],
+		chunk_rows: int = WRITE_CHUNK_ROWS,
+) -> int:
+	"""
+	Writes a TSV (header included) to a stream, one row per line, like ``write_csv_rows``.
+	Values are never quoted: backslashes, tabs and line breaks are escaped as ``\\``, ``\t``, ``\n`` and ``\r``.
+
+	:param stream: The stream to write to
+	:param header: The header of the TSV
+	:param rows: The rows of the TSV, without the header
+	:param chunk_rows: The number of rows written at once
+	:return: The number of rows written, without the header
+	"""
+
+	def line(row: Sequence) -> str:
+		return '\t'.join(__tsv_escape__(str(value)) for value in row) + '\n'
+
+	stream.write(line(header))
+
+	count = 0
+	for chunk in iter_chunks(rows, chunk_rows):
+		stream.writelines(line(row) for row in chunk)
+		count += len(chunk)
+
+	return count
+
+
+def read_tsv_rows(stream: TextIO) -> Tuple[Optional[List[str]], Iterator[Tuple[int, List[str]]]]:
+	"""
+	Reads the header of a TSV written by ``write_tsv_rows`` from a stream, leaving the rows to be read lazily.
+	Blank lines are read as empty rows.
+
+	:param stream: The stream to read from
+	:return: The header (None if the TSV is empty) and an iterator over the remaining rows, with their line number
+	"""
+
+	def split(line: str) -> List[str]:
+		line = line.rstrip('\r\n')
+		return [__tsv_unescape__(value) for value in line.split('\t')] if line else []
+
+	lines = iter(stream)
+	first_line = next(lines, None)
+
+	if first_line is None:
+		return None, iter(())
+
+	return split(first_line), ((line_number, split(line)) for line_number, line in enumerate(lines, start=2))
+
+
+def write_jsonl_rows(
+		stream: TextIO,
+		header: Sequence[str],
+		rows: Iterable[Sequence],
+		chunk_rows: int = WRITE_CHUNK_ROWS,
+) -> int:
+	"""
+	Writes a JSON Lines table to a stream, one object per row keyed by the header, like ``write_csv_rows``.
+	There is no header line, each object holds the column names.
+
+	:param stream: The stream to write to
+	:param header: The names of the columns
+	:param rows: The rows of the table
+	:param chunk_rows: The number of rows written at once
+	:return: The number of rows written
+	"""
+
+	def line(row: Sequence) -> str:
+		return json.dumps(dict(zip(header, row)), ensure_ascii=False) + '\n'
+
+	count = 0
+	for chunk in iter_chunks(rows, chunk_rows):
+		stream.writelines(line(row) for row in chunk)
+		count += len(chunk)
+
+	return count
+
+
+def read_jsonl_rows(stream: TextIO) -> Tuple[Optional[List[str]], Iterator[Tuple[int, List[str]]]]:
+	"""
+	Reads a JSON Lines table from a stream, lazily. The header is given by the keys of the first object,
+	which is also the first row. Each row holds the values of the header keys, in the same order:
+	keys missing from an object are left out (making the row shorter), extra keys are ignored.
+	Values must be strings, integers (e.g. note ids, read as ``'123'``) or ``null`` (read as ``''``),
+	and blank lines are read as empty rows.
+
+	:param stream: The stream to read from
+	:return: The header (None if there are no objects) and an iterator over all the rows, with their line number
+	:raises TableFormatError: While iterating, if a line is not a JSON object or has a value of another type
+	"""
+
+	def parse(line_number: int, line: str) -> Optional[dict]:
+
+		if not line.strip():
+			return None
+
+		try:
+			obj = json.loads(line)
+		except ValueError as e:
+			raise TableFormatError(line_number, f"invalid JSON ({e})") from e
+
+		if not isinstance(obj, dict):
+			raise TableFormatError(line_number, "not a JSON object")
+
+		return obj
+
+	def value(line_number: int, key: str, obj_value: Any) -> str:
+
+		if isinstance(obj_value, str):
+			return obj_value
+
+		if obj_value is None:
+			return ''
+
+		# Booleans are integers too
+		if isinstance(obj_value, int) and not isinstance(obj_value, bool):
+			return str(obj_value)
+
+		raise TableFormatError(line_number, f"value of '{key}' is not a string ({json.dumps(obj_value)})")
+
+	def values(line_number: int, obj: Optional[dict]) -> List[str]:
+
+		if obj is None:
+			return []
+
+		return [value(line_number, key, obj[key]) for key in header if key in obj]
+
+	lines = enumerate(stream, start=1)
+
+	# Blank lines before the first object are still rows
+	first_line = 0
+	first_obj = None
+	for first_line, line in lines:
+		first_obj = parse(first_line, line)
+		if first_obj is not None:
+			break
+
+	if first_obj is None:
+		return None, iter(())
+
+	header = list(first_obj)
+
+	def rows() -> Iterator[Tuple[int, List[str]]]:
+
+		for line_number in range(1, first_line):
+			yield line_number, []
+
+		yield first_line, values(first_line, first_obj)
+
+		for line_number, text in lines:
+			yield line_number, values(line_number, parse(line_number, text))
+
+	return header, rows()
+
+
+def __tsv_escape__(value: str) -> str:
+	"""
+	Escapes the characters that would break a TSV line.
+
+	:param value: The value to escape
+	:return: The escaped value
+	"""
+
+	if '\\' not in value and '\t' not in value and '\n' not in value and '\r' not in value:
+		return value
+
+	return ''.join(TSV_ESCAPES.get(char, char) for char in value)
+
+
+def __tsv_unescape__(value: str) -> str:
+	"""
+	Reverts ``__tsv_escape__``; unknown escape sequences are kept as they are.
+
+	:param value: The escaped value
+	:return: The original value
+	"""
+
+	if '\\' not in value:
+		return value
+
+	return re_tsv_escape.sub(lambda match: TSV_UNESCAPES.get(match.group(1), match.group(0)), value)
+
+
+class TableFormat(NamedTuple):
+	"""
+	A format of the tables exchanged by the import/export, with its streaming reader and writer.
+	"""
+
+	name: str
+	extension: str
+	""" Extension of the files, dot included """
+	write_rows: Callable[[TextIO, Sequence[str], Iterable[Sequence], int], int]
+	read_rows: Callable[[TextIO], Tuple[Optional[List[str]], Iterator[Tuple[int, List[str]]]]]
+	header_row: bool = True
+	""" Whether the columns are named by a header row, instead of by the keys of each row """
+
+
+TABLE_FORMATS: Dict[str, TableFormat] = {
+	table_format.name: table_format
+	for table_format in (
+		TableFormat('CSV', '.csv', write_csv_rows, read_csv_rows),
+		TableFormat('TSV', '.tsv', write_tsv_rows, read_tsv_rows),
+		TableFormat('JSON Lines', '.jsonl', write_jsonl_rows, read_jsonl_rows, header_row=False),
+	)
+}
+""" Supported table formats, by name """
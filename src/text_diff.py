@@ -0,0 +1,55 @@
+import difflib
+import html
+from typing import Tuple
+
+DIFF_MAX_CHARS = 5000
+""" Longer texts are not compared character by character, they are marked as entirely changed """
+
+DIFF_DELETE_STYLE = "background-color: #ffc8c8; color: #000000;"
+""" Style of the parts of the old text that were removed """
+
+DIFF_INSERT_STYLE = "background-color: #c8f0c8; color: #000000;"
+""" Style of the parts of the new text that were added """
+
+
+def html_diff(before: str, after: str) -> Tuple[str, str]:
+	"""
+	Marks the differences between two texts, character by character.
+	The texts are escaped, so that field markup is shown as source instead of being rendered.
+
+	:param before: The old text
+	:param after: The new text
+	:return: The old text with its removed parts marked, and the new text with its added parts marked
+	"""
+
+	if len(before) > DIFF_MAX_CHARS or len(after) > DIFF_MAX_CHARS:
+		return __mark__(before, DIFF_DELETE_STYLE), __mark__(after, DIFF_INSERT_STYLE)
+
+	old = list()
+	new = list()
+
+	matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+	for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+
+		if tag == 'equal':
+			old.append(html.escape(before[i1:i2]))
+			new.append(html.escape(after[j1:j2]))
+			continue
+
+		old.append(__mark__(before[i1:i2], DIFF_DELETE_STYLE))
+		new.append(__mark__(after[j1:j2], DIFF_INSERT_STYLE))
+
+	return ''.join(old), ''.join(new)
+
+
+def __mark__(text: str, style: str) -> str:
+	"""
+	:param text: The text to mark
+	:param style: The style of the mark
+	:return: The escaped text, marked with the style, or an empty string if the text is empty
+	"""
+
+	if not text:
+		return ''
+
+	return f'<span style="{style}">{html.escape(text)}</span>'
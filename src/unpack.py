@@ -1,56 +1,336 @@
 import re
-from typing import Tuple
+from typing import Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Pattern, Tuple
 
-# Regex for extracting the reading (hiragana) this format: e.g. "たる【足る】 ★★★★"
-re_reading_legacy = re.compile(r"^.*?([一-龠ぁ-ゔァ-ヴーa-zA-Z0-9ａ-ｚＡ-Ｚ０-９々〆〤ヶ]+)【.*?】.*?$")
+# Characters a reading is made of
+READING_CHARS = "一-龠ぁ-ゔァ-ヴーa-zA-Z0-9ａ-ｚＡ-Ｚ０-９々〆〤ヶ"
 
-# Regex for extracting the reading (hiragana) this format: e.g. "足る (たる) ★★★★"
-re_reading_modern = re.compile(r"^.*?\(([一-龠ぁ-ゔァ-ヴーa-zA-Z0-9ａ-ｚＡ-Ｚ０-９々〆〤ヶ]+)\).*?$")
+# Regex for finding the first reading with delimiters, in either format (single pass over the line):
+# modern, e.g. "足る (たる) ★★★★" (group 1), or legacy, e.g. "たる【足る】 ★★★★" (group 2)
+re_reading_delimited = re.compile(rf"\(([{READING_CHARS}]+)\)|([{READING_CHARS}]+)【")
 
-# Regex for extracting the reading (hiragana) this format: e.g. "たる ★★★★"
-re_reading_plain = re.compile(r"^.*?([一-龠ぁ-ゔァ-ヴーa-zA-Z0-9ａ-ｚＡ-Ｚ０-９々〆〤ヶ]+).*?$")
+# Regex for finding the reading in this format: e.g. "たる【足る】 ★★★★"
+re_reading_legacy = re.compile(rf"([{READING_CHARS}]+)【")
 
+# Regex for finding the reading in this format: e.g. "足る (たる) ★★★★"
+re_reading_modern = re.compile(rf"\(([{READING_CHARS}]+)\)")
 
-def unpack_reading(content: str) -> Tuple[str, str]:
+# Regex for finding the reading in this format: e.g. "たる ★★★★"
+re_reading_plain = re.compile(rf"([{READING_CHARS}]+)")
+
+# Regex for skipping blank lines, each ending with a line break
+re_blank_lines = re.compile(r"(?:\s*<br>)*")
+
+# Regex for checking whether the rest of the field is blank
+re_blank_tail = re.compile(r"\s*\Z")
+
+
+FORMAT_SAMPLE_NOTES = 20
+""" Number of notes of a note type matched against every format, before pinning the format of the note type """
+
+
+class DictionaryFormat(NamedTuple):
+	"""
+	An output format of a dictionary, telling how to find the reading in the expression line.
+	"""
+
+	name: str
+	pattern: Pattern
+	""" Regex finding the reading, in its first group """
+	closing: str = ""
+	""" Text that must follow the match for the line to be in this format, if any """
+	pinnable: bool = True
+	""" Whether the format can be pinned for a note type, formats matching almost any line can't """
+
+	def find(self, expression: str) -> Optional[str]:
+		"""
+		Finds the reading in the expression line, if the line is in this format.
+
+		:param expression: The first line of the field
+		:return: The reading, or ``None`` if the line is not in this format
+		"""
+
+		match = self.pattern.search(expression)
+		if match is None:
+			return None
+
+		if self.closing and expression.find(self.closing, match.end()) == -1:
+			return None
+
+		return match.group(1) or None
+
+
+FORMAT_LEGACY = DictionaryFormat("legacy", re_reading_legacy, closing="】")
+FORMAT_MODERN = DictionaryFormat("modern", re_reading_modern)
+FORMAT_PLAIN = DictionaryFormat("plain", re_reading_plain, pinnable=False)
+
+BUILTIN_FORMATS = (FORMAT_LEGACY, FORMAT_MODERN, FORMAT_PLAIN)
+""" Built-in formats, in order of precedence """
+
+
+def custom_format(pattern: str) -> DictionaryFormat:
+	"""
+	Creates a format from a user-defined regex, whose first group is the reading.
+
+	:param pattern: The regex of the format
+	:return: The format, named after its regex
+	:raises ValueError: If the regex is invalid or has no groups
+	"""
+
+	try:
+		compiled = re.compile(pattern)
+	except re.error as e:
+		raise ValueError(f"Invalid pattern '{pattern}': {e}") from e
+
+	if not compiled.groups:
+		raise ValueError(f"Pattern '{pattern}' has no group capturing the reading")
+
+	return DictionaryFormat(pattern, compiled)
+
+
+class FormatDetector:
+	"""
+	Finds the readings of a batch of notes, detecting the dictionary format of each note type.
+	The first notes of a note type are matched against every format, custom formats first;
+	if they all match the same pinnable format, the format is pinned for the note type,
+	and the following notes are only matched against it, falling back to every format on mismatch.
+	A pinned format only gives the same reading as trying every format if no format with a higher precedence
+	matches the line too (e.g. a legacy reading after a modern one), so those are checked before accepting it.
+	Without custom formats, use ``find_reading`` instead: it matches all the built-in formats in a single scan,
+	which is faster than a pinned format and its check.
+	"""
+
+	def __init__(self, custom_formats: Iterable[DictionaryFormat] = (), sample_size: int = FORMAT_SAMPLE_NOTES):
+		"""
+		Initializes the detector, with no formats detected yet.
+
+		:param custom_formats: User-defined formats, tried in order before the built-in ones
+		:param sample_size: The number of notes sampled for each note type
+		"""
+
+		self.custom_formats = tuple(custom_formats)
+		self.sample_size = sample_size
+
+		# Formats matched by the sampled notes, by note type
+		self.samples: Dict[Hashable, List[Optional[DictionaryFormat]]] = dict()
+
+		# Format of each detected note type, None if no format could be pinned
+		self.pinned: Dict[Hashable, Optional[DictionaryFormat]] = dict()
+
+		# Formats with a higher precedence than the pinned one, by note type
+		self.preceding: Dict[Hashable, Tuple[DictionaryFormat, ...]] = dict()
+
+		self.hits = 0
+		self.fallbacks = 0
+
+		return
+
+	def find_reading(self, key: Hashable, expression: str) -> Optional[str]:
+		"""
+		Finds the reading in the expression line of a note.
+
+		:param key: The note type of the note
+		:param expression: The first line of the field
+		:return: The reading, or ``None`` if there is none
+		"""
+
+		if key in self.pinned:
+			pinned = self.pinned[key]
+
+			if pinned is not None and __single_line__(expression):
+				reading = pinned.find(expression)
+				if reading is not None and not self.__preceded__(key, expression):
+					self.hits += 1
+					return reading
+
+				self.fallbacks += 1
+
+			return match_reading(expression, self.custom_formats)[0]
+
+		reading, matched = match_reading(expression, self.custom_formats)
+
+		# Pin the format once enough notes have been sampled
+		samples = self.samples.setdefault(key, list())
+		samples.append(matched)
+
+		if len(samples) >= self.sample_size:
+			first = samples[0]
+			agree = first is not None and first.pinnable and all(sample is first for sample in samples)
+			self.pinned[key] = first if agree else None
+			del self.samples[key]
+
+			if agree:
+				precedence = self.custom_formats + BUILTIN_FORMATS
+				self.preceding[key] = precedence[:precedence.index(first)]
+
+		return reading
+
+	def __preceded__(self, key: Hashable, expression: str) -> bool:
+		"""
+		:param key: The note type of the note, with a pinned format
+		:param expression: The first line of the field
+		:return: ``True`` if a format with a higher precedence than the pinned one matches the line
+		"""
+
+		return any(dict_format.find(expression) is not None for dict_format in self.preceding[key])
+
+	def stats(self) -> Dict[str, int]:
+		"""
+		:return: The number of notes matched by a pinned format, the number of fallbacks,
+			and the number of note types with a pinned format
+		"""
+
+		return {
+			"hits": self.hits,
+			"fallbacks": self.fallbacks,
+			"pinned": sum(1 for pinned in self.pinned.values() if pinned is not None),
+		}
+
+
+def unpack_reading(content: str, find: Optional[Callable[[str], Optional[str]]] = None) -> Tuple[str, str]:
 	"""
 	Unpack the content of a field into reading and meaning.
 	If the content cannot be parsed, an empty string is returned for the reading and the meaning is returned as is;
 	otherwise, the reading and the meaning (minus the reading) are returned.
 
 	:param content: The content of the field
+	:param find: Finds the reading in the expression line, ``find_reading`` by default
 	:return: A tuple containing the reading and meaning
 	"""
 
-	# Split on newline
-	split_content = content.split("<br>")
-	n_lines = len(split_content)
-
 	# First line contains reading
-	expression = split_content[0]
+	end = content.find("<br>")
+	expression = content if end == -1 else content[:end]
 
-	# Count the contiguous new lines after the expressions
-	leading_lfs = 1
-	while leading_lfs < n_lines and not split_content[leading_lfs].strip():
-		leading_lfs += 1
+	reading = (find or find_reading)(expression)
 
-	# Extract the reading (legacy)
-	match = re_reading_legacy.search(expression)
+	# No match
+	if reading is None:
+		return "", content
 
-	# Extract the reading (modern)
-	if not match:
-		match = re_reading_modern.search(expression)
+	# No lines after the expression
+	if end == -1:
+		return reading, ""
+
+	start = end + len("<br>")
+
+	# Usually, the meaning starts right after the expression
+	first_char = content[start:start + 1]
+	if first_char and first_char != "<" and not first_char.isspace():
+		return reading, content[start:]
+
+	# Skip the contiguous blank lines after the expression, the rest is the meaning
+	start = re_blank_lines.match(content, start).end()
+	if re_blank_tail.match(content, start):
+		return reading, ""
+
+	return reading, content[start:]
+
+
+def unpack_batch(custom_patterns: Tuple[str, ...], contents: List[str]) -> List[Tuple[str, str]]:
+	"""
+	Apply ``unpack_reading`` to many fields at once, trying every format on each of them (no detection).
+	Being a top-level function, it can be sent to worker processes (bind the patterns with ``functools.partial``).
+
+	:param custom_patterns: The regexes of the custom formats, see ``custom_format``
+	:param contents: The contents of the fields
+	:return: The reading and meaning of each field, in the same order
+	"""
+
+	if not custom_patterns:
+		return [unpack_reading(content) for content in contents]
+
+	custom_formats = [custom_format(pattern) for pattern in custom_patterns]
+
+	def find(expression: str) -> Optional[str]:
+		return match_reading(expression, custom_formats)[0]
+
+	return [unpack_reading(content, find) for content in contents]
+
+
+def find_reading(expression: str) -> Optional[str]:
+	"""
+	Finds the reading in the expression line, in any of the built-in formats.
+	Lines broken by a newline (except a trailing one) have no reading.
+
+	:param expression: The first line of the field
+	:return: The reading, or ``None`` if there is none
+	"""
+
+	if not __single_line__(expression):
+		return None
 
-	# Extract the reading (plain)
+	return __match_builtin__(expression)[0]
+
+
+def match_reading(
+		expression: str,
+		custom_formats: Iterable[DictionaryFormat] = (),
+) -> Tuple[Optional[str], Optional[DictionaryFormat]]:
+	"""
+	Finds the reading in the expression line, trying every format in order of precedence:
+	the custom formats first, then the built-in ones.
+	Lines broken by a newline (except a trailing one) have no reading.
+
+	:param expression: The first line of the field
+	:param custom_formats: User-defined formats, in order of precedence
+	:return: The reading and the format it was found with, or ``(None, None)``
+	"""
+
+	if not __single_line__(expression):
+		return None, None
+
+	for dict_format in custom_formats:
+		reading = dict_format.find(expression)
+		if reading is not None:
+			return reading, dict_format
+
+	return __match_builtin__(expression)
+
+
+def __single_line__(expression: str) -> bool:
+	"""
+	:param expression: The first line of the field
+	:return: ``False`` if the line is broken by a newline (except a trailing one), ``True`` otherwise
+	"""
+
+	return "\n" not in expression or expression.find("\n") == len(expression) - 1
+
+
+def __match_builtin__(expression: str) -> Tuple[Optional[str], Optional[DictionaryFormat]]:
+	"""
+	Finds the reading in the expression line, scanning it once from left to right.
+	Gives the same result as trying the built-in formats in order of precedence:
+	the legacy format anywhere in the line wins, then the first modern format,
+	then the first run of reading characters (plain format).
+
+	:param expression: The first line of the field
+	:return: The reading and the format it was found with, or ``(None, None)``
+	"""
+
+	match = re_reading_delimited.search(expression)
+
+	# Neither format, the first run of reading characters is the reading
 	if not match:
 		match = re_reading_plain.search(expression)
+		return (match.group(1), FORMAT_PLAIN) if match else (None, None)
 
-	# No match
-	if not match:
-		return "", content
+	# Legacy reading, needs a closing bracket
+	if match.lastindex == 2:
+		if expression.find("】", match.end()) != -1:
+			return match.group(2), FORMAT_LEGACY
+
+		# Later "【" have no closing bracket either, resume with the modern format
+		match = re_reading_modern.search(expression, match.end())
+		if match:
+			return match.group(1), FORMAT_MODERN
+
+		return re_reading_plain.search(expression).group(1), FORMAT_PLAIN
 
-	reading = match.group(1)
+	# Modern reading, unless a legacy one follows
+	modern = match.group(1)
 
-	# The rest is the meaning
-	meaning = '<br>'.join(split_content[leading_lfs:])
+	match = re_reading_legacy.search(expression, match.end())
+	if match and expression.find("】", match.end()) != -1:
+		return match.group(1), FORMAT_LEGACY
 
-	return reading, meaning
+	return modern, FORMAT_MODERN
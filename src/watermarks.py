@@ -0,0 +1,111 @@
+import sqlite3
+from typing import Dict, List, Sequence
+
+WATERMARKS_QUERY_IDS = 500
+""" Number of note ids looked up in a single query """
+
+
+class WatermarkStore:
+	"""
+	Persistent record of the notes processed by each operation, for the incremental mode, stored in a SQLite file.
+	For each note, it keeps the modification time the note had after the last run of the operation that processed it,
+	written or not, so a note only needs processing again if modified since. Only notes actually processed are
+	recorded: a run over some notes says nothing about the others. The records of an operation are tied to a hash of
+	its settings, and are discarded when the settings change.
+	"""
+
+	def __init__(self, path: str):
+		"""
+		Opens the store file, creating it if missing.
+
+		:param path: The path of the store file
+		:raises sqlite3.Error: If the file can't be opened
+		"""
+
+		self.conn = sqlite3.connect(path)
+
+		self.conn.execute("create table if not exists operations (key text primary key, config text not null)")
+		self.conn.execute(
+			"create table if not exists processed ("
+			"key text not null, note_id integer not null, mod integer not null, "
+			"primary key (key, note_id)) without rowid"
+		)
+		self.conn.commit()
+
+		return
+
+	def processed(self, key: str, config: str, note_ids: Sequence[int]) -> Dict[int, int]:
+		"""
+		Finds which of the given notes the operation processed, with its current settings.
+
+		:param key: The identifier of the operation
+		:param config: The hash of the settings of the operation
+		:param note_ids: The ids of the notes
+		:return: The modification time of each processed note after its processing, by note id
+		"""
+
+		row = self.conn.execute("select config from operations where key = ?", (key,)).fetchone()
+		if row is None or row[0] != config:
+			return dict()
+
+		processed: Dict[int, int] = dict()
+		for i in range(0, len(note_ids), WATERMARKS_QUERY_IDS):
+			chunk = note_ids[i:i + WATERMARKS_QUERY_IDS]
+			placeholders = ', '.join('?' * len(chunk))
+			rows = self.conn.execute(
+				f"select note_id, mod from processed where key = ? and note_id in ({placeholders})", (key, *chunk)
+			)
+			processed.update(rows)
+
+		return processed
+
+	def save(self, key: str, config: str, mods: Dict[int, int]) -> None:
+		"""
+		Records the notes processed by a run of the operation.
+		If the settings of the operation changed, the notes processed with the previous ones are forgotten.
+
+		:param key: The identifier of the operation
+		:param config: The hash of the settings of the operation
+		:param mods: The modification time of each processed note after its processing, by note id
+		:return: ``None``
+		"""
+
+		row = self.conn.execute("select config from operations where key = ?", (key,)).fetchone()
+		if row is None or row[0] != config:
+			self.conn.execute("delete from processed where key = ?", (key,))
+			self.conn.execute("insert or replace into operations (key, config) values (?, ?)", (key, config))
+
+		self.conn.executemany(
+			"insert or replace into processed (key, note_id, mod) values (?, ?, ?)",
+			[(key, note_id, mod) for note_id, mod in mods.items()],
+		)
+		self.conn.commit()
+
+		return
+
+	def close(self) -> None:
+		"""
+		Closes the file.
+
+		:return: ``None``
+		"""
+
+		self.conn.close()
+
+		return
+
+
+def modified_note_ids(note_ids: Sequence[int], processed: Dict[int, int], mods: Dict[int, int]) -> List[int]:
+	"""
+	Filters the notes to process again, the ones never processed and the ones modified since their processing.
+
+	:param note_ids: The ids of the notes
+	:param processed: The modification time of each processed note after its processing, by note id
+	:param mods: The current modification time of each processed note, by note id, missing for deleted notes
+	:return: The ids of the notes to process, in the given order
+	"""
+
+	return [
+		note_id for note_id in note_ids
+		if note_id not in processed or mods.get(note_id, processed[note_id]) > processed[note_id]
+	]
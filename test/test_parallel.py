@@ -0,0 +1,72 @@
+import os
+
+os.environ["SKY_BULKOPS_SKIP_AQT"] = "1"
+from functools import partial
+from typing import List
+from unittest import TestCase
+
+from src.parallel import map_batches
+from src.pitch import classify_pitch_batch, colour_fields_batch, colour_fields_from_pitch, PitchTypes
+from src.unpack import unpack_batch
+
+
+def scale(factor: int, values: List[int]) -> List[int]:
+	return [value * factor for value in values]
+
+
+class TestParallel(TestCase):
+
+	def test_map_serial(self):
+		x = [(i, str(i)) for i in range(10)]
+
+		y = list(map_batches(partial(scale, 2), x, lambda item: item[0], chunk_size=3))
+
+		self.assertEqual(y, [(item, item[0] * 2) for item in x])
+
+	def test_map_workers(self):
+		x = list(range(1000))
+
+		y = list(map_batches(partial(scale, 3), x, lambda item: item, workers=2, chunk_size=7))
+
+		self.assertEqual(y, [(item, item * 3) for item in x])
+
+	def test_map_unpicklable_fallback(self):
+		x = list(range(50))
+
+		# Lambdas can't be sent to the workers, everything is transformed here instead
+		y = list(map_batches(lambda values: [-value for value in values], x, lambda item: item, workers=2, chunk_size=4))
+
+		self.assertEqual(y, [(item, -item) for item in x])
+
+	def test_map_error(self):
+		with self.assertRaises(ZeroDivisionError):
+			list(map_batches(partial(scale, 1), [1, 0], lambda item: 1 // item, workers=1))
+
+	def test_map_pitch_batch(self):
+		x = ['<font color="white">いく</font>'] * 5
+
+		y = list(map_batches(lambda fields: list(classify_pitch_batch(fields).codes), x, str, chunk_size=2))
+
+		self.assertEqual([code for _, code in y], [-1] * 5)
+
+	def test_map_unpack_workers(self):
+		x = ['たる【足る】<br>to suffice', '足る [たる]<br>to suffice', '']
+
+		y = list(map_batches(partial(unpack_batch, (r'\[(\w+)\]',)), x, str, workers=2, chunk_size=1))
+
+		self.assertEqual([result for _, result in y], [('たる', 'to suffice'), ('たる', 'to suffice'), ('', '')])
+
+	def test_map_colour_workers(self):
+		colours = {pitch_type: pitch_type.value for pitch_type in PitchTypes}
+		x = [('<font color="white">いく</font>', {'Reading': 'いく'}, None), ('', {'Reading': 'いく'}, 0)]
+
+		y = list(map_batches(partial(colour_fields_batch, colours, False), x, tuple, workers=1))
+
+		self.assertEqual([result for _, result in y], [(-1, {}), (0, {'Reading': '<font color="heiban">いく</font>'})])
+
+	def test_colour_known_pitch_code(self):
+		colours = {pitch_type: pitch_type.value for pitch_type in PitchTypes}
+
+		y = colour_fields_from_pitch('', {'Reading': 'いく', 'Meaning': ''}, colours, pitch_code=0)
+
+		self.assertEqual(y, (0, {'Reading': '<font color="heiban">いく</font>'}))
@@ -0,0 +1,154 @@
+import os
+
+os.environ["SKY_BULKOPS_SKIP_AQT"] = "1"
+from typing import List, Tuple
+from unittest import TestCase
+
+from src.pitch import (
+	find_pitch_graph_nodes, infer_pitch_type_from_graph, PitchTypes, PitchTypeCache, pitch_type_cache,
+	classify_pitch_batch, PitchFailReasons, PITCH_CODE_NONE,
+)
+
+
+def build_field(nodes: List[Tuple[int, int]], accent_start: str = 'accent_start') -> str:
+	"""
+	Builds a reading field with a pitch graph containing the given nodes.
+	The last node is drawn twice, like the hollow particle node of the real graphs.
+
+	:param nodes: (cx, cy) coordinates of the nodes
+	:param accent_start: name of the accent start marker
+	:return: The field content
+	"""
+
+	circles = ''.join(
+		f'<circle r="5" cx="{cx}" cy="{cy}" style="opacity:1;fill:#000;"></circle>'
+		for cx, cy in nodes
+	)
+	cx, cy = nodes[-1]
+	circles += f'<circle r="3.25" cx="{cx}" cy="{cy}" style="opacity:1;fill:#fff;"></circle>'
+
+	return (
+		f'いく<!-- {accent_start} --><br><hr><br>'
+		f'<svg class="pitch" width="102px" height="75px" viewBox="0 0 102 75">'
+		f'<path d="m 16,30 35,-25" style="fill:none;stroke:#000;stroke-width:1.5;"></path>'
+		f'{circles}</svg><!-- accent_end -->'
+	)
+
+
+class TestPitchType(TestCase):
+
+	def test_nodes_noaccent(self):
+		self.assertIsNone(find_pitch_graph_nodes('<font color="white">いく</font>'))
+
+	def test_nodes(self):
+		x = build_field([(16, 30), (51, 5), (86, 5)])
+
+		y = [(16, 30), (51, 5), (86, 5), (86, 5)]
+
+		self.assertEqual(find_pitch_graph_nodes(x), y)
+
+	def test_nodes_useraccent(self):
+		x = build_field([(16, 30), (51, 5)], accent_start='user_accent_start')
+
+		y = [(16, 30), (51, 5), (51, 5)]
+
+		self.assertEqual(find_pitch_graph_nodes(x), y)
+
+	def test_nodes_attribute_order(self):
+		x = '<!-- accent_start --><svg><circle cy="30" r="5" cx="16"></circle></svg><!-- accent_end -->'
+
+		self.assertEqual(find_pitch_graph_nodes(x), [(16, 30)])
+
+	def test_nodes_malformed(self):
+		x = '<!-- accent_start --><svg><circle r="5" cx="16.5" cy="30"></circle></svg><!-- accent_end -->'
+
+		with self.assertRaises(ValueError):
+			find_pitch_graph_nodes(x)
+
+	def test_infer_heiban(self):
+		x = find_pitch_graph_nodes(build_field([(16, 30), (51, 5), (86, 5)]))
+
+		self.assertEqual(infer_pitch_type_from_graph(x), PitchTypes.HEIBAN)
+
+	def test_infer_atamadaka(self):
+		x = find_pitch_graph_nodes(build_field([(16, 5), (51, 30), (86, 30)]))
+
+		self.assertEqual(infer_pitch_type_from_graph(x), PitchTypes.ATAMADAKA)
+
+	def test_infer_nakadaka(self):
+		x = find_pitch_graph_nodes(build_field([(16, 30), (51, 5), (86, 30), (121, 30)]))
+
+		self.assertEqual(infer_pitch_type_from_graph(x), PitchTypes.NAKADAKA)
+
+	def test_infer_oodaka(self):
+		x = find_pitch_graph_nodes(build_field([(16, 30), (51, 5), (86, 30)]))
+
+		self.assertEqual(infer_pitch_type_from_graph(x), PitchTypes.OODAKA)
+
+	def test_infer_too_few_nodes(self):
+		x = find_pitch_graph_nodes(build_field([(16, 30)]))
+
+		self.assertIsNone(infer_pitch_type_from_graph(x))
+
+	def test_infer_cached_signature(self):
+		pitch_type_cache.clear()
+
+		# Same shape, different coordinates
+		x = find_pitch_graph_nodes(build_field([(16, 30), (51, 5), (86, 5)]))
+		y = find_pitch_graph_nodes(build_field([(10, 40), (40, 10), (70, 10)]))
+
+		self.assertEqual(infer_pitch_type_from_graph(x), PitchTypes.HEIBAN)
+		self.assertEqual(infer_pitch_type_from_graph(y), PitchTypes.HEIBAN)
+		self.assertEqual(pitch_type_cache.stats(), {"hits": 1, "misses": 1, "evictions": 0, "size": 1})
+
+	def test_cache_eviction(self):
+		cache = PitchTypeCache(maxsize=2)
+
+		cache.put((True, False), PitchTypes.ATAMADAKA)
+		cache.put((False, True), PitchTypes.HEIBAN)
+
+		# Touch the first signature, so the second one is the least recently used
+		self.assertEqual(cache.get((True, False)), PitchTypes.ATAMADAKA)
+
+		cache.put((False, True, False), PitchTypes.OODAKA)
+
+		self.assertIsNone(cache.get((False, True)))
+		self.assertEqual(cache.get((False, True, False)), PitchTypes.OODAKA)
+		self.assertEqual(cache.stats(), {"hits": 2, "misses": 1, "evictions": 1, "size": 2})
+
+	def test_classify_batch(self):
+		x = [
+			build_field([(16, 30), (51, 5), (86, 5)]),
+			'<font color="white">いく</font>',
+			build_field([(16, 30)]),
+			'<!-- accent_start --><svg><circle r="5" cx="16.5" cy="30"></circle></svg><!-- accent_end -->',
+			build_field([(16, 5), (51, 30)]),
+		]
+
+		result = classify_pitch_batch(x)
+
+		self.assertEqual(result.codes.typecode, 'b')
+		self.assertEqual(
+			[result.pitch_type(i) for i in range(len(x))],
+			[PitchTypes.HEIBAN, None, None, None, PitchTypes.ATAMADAKA],
+		)
+		self.assertEqual(result.codes[1], PITCH_CODE_NONE)
+		self.assertEqual(
+			list(result.reasons),
+			[
+				PitchFailReasons.NONE,
+				PitchFailReasons.NO_SECTION,
+				PitchFailReasons.TOO_FEW_NODES,
+				PitchFailReasons.MALFORMED,
+				PitchFailReasons.NONE,
+			],
+		)
+		self.assertEqual(result.counts(), {
+			"heiban": 1,
+			"atamadaka": 1,
+			"nakadaka": 0,
+			"oodaka": 0,
+			"no_section": 1,
+			"too_few_nodes": 1,
+			"malformed": 1,
+		})
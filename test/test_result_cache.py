@@ -0,0 +1,58 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from src.result_cache import ResultCache
+
+
+class TestResultCache(TestCase):
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tmp_dir.name, 'cache.sqlite')
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+	def test_round_trip(self):
+		cache = ResultCache(self.path, {'unpack': '1'})
+		cache.put_many('unpack', [('たる【足る】<br>to suffice', ['たる', 12]), ('盤', ['', 0])])
+		cache.close()
+
+		cache = ResultCache(self.path, {'unpack': '1'})
+		x = ['盤', 'たる【足る】<br>to suffice', 'こぼれ', '盤']
+
+		self.assertEqual(cache.get_many('unpack', x), [['', 0], ['たる', 12], None, ['', 0]])
+		self.assertEqual(cache.get_many('pitch', x[:1]), [None])
+		self.assertEqual(cache.stats(), {'hits': 3, 'misses': 2, 'evictions': 0})
+		cache.close()
+
+	def test_version_change(self):
+		cache = ResultCache(self.path, {'unpack': '1', 'pitch': '1'})
+		cache.put_many('unpack', [('盤', ['', 0])])
+		cache.put_many('pitch', [('盤', -1)])
+		cache.close()
+
+		cache = ResultCache(self.path, {'unpack': '2'})
+
+		self.assertEqual(cache.get_many('unpack', ['盤']), [None])
+		self.assertEqual(cache.get_many('pitch', ['盤']), [-1])
+		cache.close()
+
+	def test_evict_least_recently_used(self):
+		cache = ResultCache(self.path, {'pitch': '1'}, max_entries=2)
+		cache.put_many('pitch', [('a', 0), ('b', 1)])
+		cache.close()
+
+		# Use 'a' in a later run, then add a third result
+		cache = ResultCache(self.path, {'pitch': '1'}, max_entries=2)
+		cache.now += 1
+		cache.get_many('pitch', ['a'])
+		cache.put_many('pitch', [('c', 2)])
+		cache.close()
+
+		self.assertEqual(cache.evictions, 1)
+
+		cache = ResultCache(self.path, {'pitch': '1'}, max_entries=2)
+		self.assertEqual(cache.get_many('pitch', ['a', 'b', 'c']), [0, None, 2])
+		cache.close()
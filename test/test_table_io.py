@@ -0,0 +1,132 @@
+import os
+
+os.environ["SKY_BULKOPS_SKIP_AQT"] = "1"
+import csv
+import gzip
+import tempfile
+from io import StringIO
+from unittest import TestCase
+
+from src.table_io import (
+	open_table_file, write_csv_rows, read_csv_rows, iter_chunks,
+	write_tsv_rows, read_tsv_rows, write_jsonl_rows, read_jsonl_rows, TableFormatError, TABLE_FORMATS,
+)
+
+
+class TestTableIO(TestCase):
+
+	def test_write_csv_rows(self):
+		rows = [[1, 'のける', '1. to put<br>"aside"'], [2, '盤', ''], [3, 'こぼれ', 'nick, chip']]
+
+		output = StringIO()
+		count = write_csv_rows(output, ['Note ID', 'Expression', 'Meaning'], iter(rows), chunk_rows=2)
+
+		self.assertEqual(count, 3)
+		self.assertEqual(
+			list(csv.reader(StringIO(output.getvalue()))),
+			[['Note ID', 'Expression', 'Meaning']] + [[str(value) for value in row] for row in rows],
+		)
+
+	def test_write_csv_rows_empty(self):
+		output = StringIO()
+		count = write_csv_rows(output, ['Note ID'], [])
+
+		self.assertEqual(count, 0)
+		self.assertEqual(output.getvalue(), 'Note ID\r\n')
+
+	def test_open_table_file_gzip(self):
+		with tempfile.TemporaryDirectory() as tmp_dir:
+			path = os.path.join(tmp_dir, 'export.csv.gz')
+
+			with open_table_file(path, 'w') as stream:
+				write_csv_rows(stream, ['Note ID', 'Reading'], [[1, 'たる']])
+
+			# File is actually compressed
+			with gzip.open(path, 'rt', encoding='utf-8', newline='') as stream:
+				self.assertEqual(stream.read(), 'Note ID,Reading\r\n1,たる\r\n')
+
+			with open_table_file(path) as stream:
+				self.assertEqual(list(csv.reader(stream)), [['Note ID', 'Reading'], ['1', 'たる']])
+
+	def test_read_csv_rows(self):
+		header, rows = read_csv_rows(StringIO('Note ID,Reading\r\n1,"た\r\nる"\r\n\r\n2,"a,b"\r\n'))
+
+		self.assertEqual(header, ['Note ID', 'Reading'])
+		self.assertEqual(list(rows), [(2, ['1', 'た\r\nる']), (4, []), (5, ['2', 'a,b'])])
+
+	def test_read_csv_rows_empty(self):
+		header, rows = read_csv_rows(StringIO(''))
+
+		self.assertIsNone(header)
+		self.assertEqual(list(rows), [])
+
+	def test_iter_chunks(self):
+		self.assertEqual(list(iter_chunks(iter(range(5)), 2)), [[0, 1], [2, 3], [4]])
+		self.assertEqual(list(iter_chunks([], 2)), [])
+
+	def test_tsv_round_trip(self):
+		rows = [[1, 'のける', '1. to put<br>"aside"'], [2, 'tab\there', 'line\nbreak \\n']]
+
+		output = StringIO()
+		count = write_tsv_rows(output, ['Note ID', 'Expression', 'Meaning'], rows, chunk_rows=1)
+
+		self.assertEqual(count, 2)
+		self.assertEqual(output.getvalue().count('\n'), 3)
+
+		header, read_rows = read_tsv_rows(StringIO(output.getvalue()))
+
+		self.assertEqual(header, ['Note ID', 'Expression', 'Meaning'])
+		self.assertEqual(list(read_rows), [(i, [str(value) for value in row]) for i, row in enumerate(rows, start=2)])
+
+	def test_read_tsv_rows_empty(self):
+		header, rows = read_tsv_rows(StringIO(''))
+
+		self.assertIsNone(header)
+		self.assertEqual(list(rows), [])
+
+	def test_jsonl_round_trip(self):
+		rows = [[1, 'のける', '1. to put<br>"aside"'], [2, '盤', 'line\nbreak']]
+
+		output = StringIO()
+		count = write_jsonl_rows(output, ['Note ID', 'Expression', 'Meaning'], rows)
+
+		self.assertEqual(count, 2)
+		self.assertEqual(output.getvalue().splitlines()[0], '{"Note ID": 1, "Expression": "のける", "Meaning": "1. to put<br>\\"aside\\""}')
+
+		header, read_rows = read_jsonl_rows(StringIO(output.getvalue()))
+
+		self.assertEqual(header, ['Note ID', 'Expression', 'Meaning'])
+		self.assertEqual(list(read_rows), [(i, [str(value) for value in row]) for i, row in enumerate(rows, start=1)])
+
+	def test_read_jsonl_rows_keys(self):
+		x = '\n{"Note ID": 1, "Reading": "たる"}\n\n{"Reading": "盤", "Note ID": 2, "Extra": 0}\n{"Note ID": 3}\n'
+
+		header, rows = read_jsonl_rows(StringIO(x))
+
+		self.assertEqual(header, ['Note ID', 'Reading'])
+		self.assertEqual(list(rows), [(1, []), (2, ['1', 'たる']), (3, []), (4, ['2', '盤']), (5, ['3'])])
+
+	def test_read_jsonl_rows_malformed(self):
+		header, rows = read_jsonl_rows(StringIO('{"Note ID": 1}\n[2]\n'))
+
+		self.assertEqual(header, ['Note ID'])
+		self.assertEqual(next(rows), (1, ['1']))
+
+		with self.assertRaises(TableFormatError) as ctx:
+			next(rows)
+
+		self.assertEqual(ctx.exception.line_number, 2)
+
+	def test_read_jsonl_rows_values(self):
+		header, rows = read_jsonl_rows(StringIO('{"Note ID": 1, "Meaning": null}\n{"Note ID": 2, "Meaning": true}\n'))
+
+		self.assertEqual(next(rows), (1, ['1', '']))
+
+		with self.assertRaises(TableFormatError) as ctx:
+			next(rows)
+
+		self.assertEqual(str(ctx.exception), "Line 2: value of 'Meaning' is not a string (true)")
+
+	def test_table_formats(self):
+		self.assertEqual([fmt.extension for fmt in TABLE_FORMATS.values()], ['.csv', '.tsv', '.jsonl'])
+		self.assertEqual([fmt.header_row for fmt in TABLE_FORMATS.values()], [True, True, False])
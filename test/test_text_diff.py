@@ -0,0 +1,25 @@
+from unittest import TestCase
+
+from src.text_diff import html_diff, DIFF_DELETE_STYLE, DIFF_INSERT_STYLE, DIFF_MAX_CHARS
+
+
+class TestTextDiff(TestCase):
+
+	def test_html_diff_unchanged(self):
+		self.assertEqual(html_diff('たる<br>', 'たる<br>'), ('たる&lt;br&gt;', 'たる&lt;br&gt;'))
+
+	def test_html_diff_marks(self):
+		before, after = html_diff('たる【樽】', '<font color="red">たる</font>')
+
+		self.assertEqual(
+			after,
+			f'<span style="{DIFF_INSERT_STYLE}">&lt;font color=&quot;red&quot;&gt;</span>たる'
+			f'<span style="{DIFF_INSERT_STYLE}">&lt;/font&gt;</span>',
+		)
+		self.assertEqual(before, f'たる<span style="{DIFF_DELETE_STYLE}">【樽】</span>')
+
+	def test_html_diff_long(self):
+		before, after = html_diff('a' * (DIFF_MAX_CHARS + 1), 'b')
+
+		self.assertTrue(before.startswith(f'<span style="{DIFF_DELETE_STYLE}">'))
+		self.assertEqual(after, f'<span style="{DIFF_INSERT_STYLE}">b</span>')
@@ -3,7 +3,9 @@ import logging
 from typing import Dict
 from unittest import TestCase
 
-from src.unpack import unpack_reading
+from src.unpack import (
+	unpack_reading, find_reading, FormatDetector, custom_format, FORMAT_LEGACY, FORMAT_MODERN,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -43,6 +45,141 @@ class TestUnpack(TestCase):
 
 		return
 
+	def test_find_reading_precedence(self) -> None:
+		"""
+		Tests the precedence of the reading formats, and lines without a reading.
+
+		:return: ``None``
+		"""
+
+		cases = [
+			('たる【足る】 ★★★★', 'たる'),
+			('足る (たる) ★★★★', 'たる'),
+			('たる ★★★★', 'たる'),
+			# Legacy wins over an earlier modern reading
+			('足る (たる) たり【足り】', 'たり'),
+			# Legacy without closing bracket falls back to modern, then plain
+			('たる【足る (たり)', 'たり'),
+			('たる【足る', 'たる'),
+			# Modern needs the parentheses right around the reading
+			('足る ( たる )', '足る'),
+			# Trailing newline only
+			('たる【足る】\n', 'たる'),
+			('たる\n【足る】', None),
+			('★★★★', None),
+			('', None),
+		]
+
+		for x, y in cases:
+			with self.subTest(msg=f'Find reading: {x!r}'):
+				self.assertEqual(find_reading(x), y)
+
+		return
+
+	def test_format_detector_pin(self) -> None:
+		"""
+		Tests that the format agreed on by the sampled notes of a note type is pinned,
+		and that the notes it doesn't match fall back to every format.
+
+		:return: ``None``
+		"""
+
+		detector = FormatDetector(sample_size=2)
+
+		self.assertEqual(detector.find_reading(1, 'たる【足る】 ★★★★'), 'たる')
+		self.assertEqual(detector.find_reading(2, '足る (たる) ★★★★'), 'たる')
+		self.assertEqual(detector.find_reading(1, 'さら【盤】'), 'さら')
+		self.assertEqual(detector.find_reading(2, 'たる ★★★★'), 'たる')
+
+		# Type 2 samples disagree, nothing is pinned
+		self.assertEqual(detector.pinned, {1: FORMAT_LEGACY, 2: None})
+
+		self.assertEqual(detector.find_reading(1, 'こぼれ【毀れ】'), 'こぼれ')
+		self.assertEqual(detector.find_reading(1, '拡張 (かくちょう) ★'), 'かくちょう')
+		self.assertEqual(detector.find_reading(2, 'いく【行く】'), 'いく')
+		self.assertEqual(detector.stats(), {"hits": 1, "fallbacks": 1, "pinned": 1})
+
+		return
+
+	def test_format_detector_plain(self) -> None:
+		"""
+		Tests that the plain format, matching almost any line, is never pinned.
+
+		:return: ``None``
+		"""
+
+		detector = FormatDetector(sample_size=1)
+
+		self.assertEqual(detector.find_reading(1, 'たる ★★★★'), 'たる')
+		self.assertEqual(detector.find_reading(1, '足る (たる) ★★★★'), 'たる')
+		self.assertEqual(detector.pinned, {1: None})
+
+		return
+
+	def test_format_detector_custom(self) -> None:
+		"""
+		Tests that custom formats take precedence over the built-in ones, and can be pinned.
+
+		:return: ``None``
+		"""
+
+		bracket = custom_format(r'\[(\w+)\]')
+		detector = FormatDetector([bracket], sample_size=1)
+
+		self.assertEqual(detector.find_reading(1, '足る [たる] (たり)'), 'たる')
+		self.assertEqual(detector.pinned, {1: bracket})
+		self.assertEqual(detector.find_reading(1, '足る (たる)'), 'たる')
+
+		self.assertEqual(
+			unpack_reading('足る [たる]<br><br>to suffice', lambda x: detector.find_reading(1, x)),
+			('たる', 'to suffice'),
+		)
+
+		return
+
+	def test_format_detector_pinned_precedence(self) -> None:
+		"""
+		Tests that a pinned format doesn't take precedence over the formats before it,
+		so that the reading is the same as without pinning.
+
+		:return: ``None``
+		"""
+
+		detector = FormatDetector(sample_size=1)
+
+		self.assertEqual(detector.find_reading(1, '足る (たる)'), 'たる')
+		self.assertEqual(detector.pinned, {1: FORMAT_MODERN})
+
+		x = '足る (たる) あし【足】'
+		self.assertEqual(detector.find_reading(1, x), 'あし')
+		self.assertEqual(detector.find_reading(1, x), find_reading(x))
+		self.assertEqual(detector.stats(), {"hits": 0, "fallbacks": 2, "pinned": 1})
+
+		# Custom formats come before the pinned built-in ones
+		bracket = custom_format(r'\[(\w+)\]')
+		detector = FormatDetector([bracket], sample_size=1)
+
+		self.assertEqual(detector.find_reading(1, 'たる【足る】'), 'たる')
+		self.assertEqual(detector.find_reading(1, 'たる【足る】 [たり]'), 'たり')
+
+		return
+
+	def test_custom_format_invalid(self) -> None:
+		"""
+		Tests that invalid custom patterns are rejected.
+
+		:return: ``None``
+		"""
+
+		for x in [r'\[(\w+\]', r'\[\w+\]']:
+			with self.subTest(msg=f'Custom format: {x}'):
+				with self.assertRaises(ValueError):
+					custom_format(x)
+
+		self.assertEqual(FORMAT_MODERN.find('足る (たる)'), 'たる')
+
+		return
+
 	def _test_unpack_row(self, x_row: Dict[str, str], y_row: Dict[str, str]) -> None:
 		"""
 		Tests a single row of the unpacking function. See ``TestUnpack.test_unpack`` for details.
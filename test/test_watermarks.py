@@ -0,0 +1,51 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from src.watermarks import modified_note_ids, WatermarkStore
+
+
+class TestWatermarks(TestCase):
+
+	def setUp(self):
+		self.tmp_dir = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tmp_dir.name, 'watermarks.sqlite')
+
+	def tearDown(self):
+		self.tmp_dir.cleanup()
+
+	def test_processed_only_covers_saved_notes(self):
+		store = WatermarkStore(self.path)
+		store.save('pitch', 'a', {1: 100, 2: 100})
+		store.close()
+
+		# Another run over other notes keeps the first ones
+		store = WatermarkStore(self.path)
+		store.save('pitch', 'a', {3: 200})
+
+		self.assertEqual(store.processed('pitch', 'a', [1, 2, 3, 4]), {1: 100, 2: 100, 3: 200})
+		self.assertEqual(store.processed('unpack', 'a', [1]), {})
+		store.close()
+
+	def test_config_change(self):
+		store = WatermarkStore(self.path)
+		store.save('pitch', 'a', {1: 100, 2: 100})
+
+		self.assertEqual(store.processed('pitch', 'b', [1, 2]), {})
+
+		store.save('pitch', 'b', {2: 200})
+
+		self.assertEqual(store.processed('pitch', 'b', [1, 2]), {2: 200})
+		self.assertEqual(store.processed('pitch', 'a', [1, 2]), {})
+		store.close()
+
+	def test_written_notes_skipped(self):
+		# Note 1 read at 100 and written at 150, note 2 read at 120 and left unchanged
+		store = WatermarkStore(self.path)
+		store.save('unpack', 'a', {1: 150, 2: 120})
+		processed = store.processed('unpack', 'a', [1, 2, 3])
+		store.close()
+
+		self.assertEqual(modified_note_ids([1, 2, 3], processed, {1: 150, 2: 120}), [3])
+		self.assertEqual(modified_note_ids([1, 2, 3], processed, {1: 160, 2: 120}), [1, 3])
+		self.assertEqual(modified_note_ids([1, 2, 3], processed, {2: 121}), [2, 3])